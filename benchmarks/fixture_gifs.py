@@ -0,0 +1,66 @@
+# benchmarks/fixture_gifs.py
+"""
+Deterministic fixture GIFs for the benchmarks and the Giphy stub server.
+
+The GIFs are generated rather than checked in: each one is a small animated
+scene (moving shapes on a coloured background), so CLIP embeddings differ
+between GIFs and frame decoding does real work.
+"""
+import os
+
+from PIL import Image, ImageDraw
+
+DEFAULT_COUNT = 24
+SIZE = (200, 150)
+FRAMES = 8
+
+
+def _palette(index):
+    # Spread hues around the colour wheel so neighbouring fixtures look different
+    r = (index * 97) % 256
+    g = (index * 57 + 80) % 256
+    b = (index * 151 + 40) % 256
+    return (r, g, b), (255 - r, 255 - g, 255 - b)
+
+
+def make_fixture_gif(path, index, size=SIZE, frames=FRAMES):
+    """Writes one animated fixture GIF to path."""
+    background, foreground = _palette(index)
+    images = []
+    width, height = size
+    for frame in range(frames):
+        image = Image.new("RGB", size, background)
+        draw = ImageDraw.Draw(image)
+        offset = (frame * width // frames + index * 7) % width
+        radius = 15 + (index % 5) * 6
+        if index % 3 == 0:
+            draw.ellipse([offset - radius, height // 2 - radius, offset + radius, height // 2 + radius], fill=foreground)
+        elif index % 3 == 1:
+            draw.rectangle([offset - radius, 20, offset + radius, 20 + 2 * radius], fill=foreground)
+        else:
+            draw.polygon([(offset, 10), (offset - radius, height - 10), (offset + radius, height - 10)], fill=foreground)
+        draw.text((5, 5), f"fixture {index:02d}", fill=foreground)
+        images.append(image)
+    images[0].save(path, save_all=True, append_images=images[1:], duration=80, loop=0)
+
+
+def ensure_fixture_gifs(directory, count=DEFAULT_COUNT):
+    """
+    Creates fixtureNN.gif files in directory if they are missing.
+    Returns the list of GIF paths, ordered by index.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"fixture{index:02d}.gif")
+        if not os.path.exists(path):
+            make_fixture_gif(path, index)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    import sys
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "fixtures", "gifs")
+    for gif_path in ensure_fixture_gifs(target):
+        print(gif_path)
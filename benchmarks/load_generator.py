@@ -0,0 +1,234 @@
+# benchmarks/load_generator.py
+"""
+End-to-end load generator that replays chat transcripts against the Flask app.
+
+Each simulated session walks through one transcript and drives the same
+calls as the frontend:
+
+  * the sender types the message; every pause of at least the debounce time
+    (1s in ChatWindow) with 3+ characters typed fires POST /generate_text_gifs
+  * when user 2 sends, POST /send_message_user2
+  * the receiving window fetches POST /generate_reply_gifs for the new message
+
+Sessions arrive as a Poisson process. Latency percentiles and throughput are
+reported per endpoint. With --local the Giphy stub and the app on model
+stand-ins are started automatically:
+
+    python benchmarks/load_generator.py --local --sessions 50 --arrival-rate 2 --speed 5
+    python benchmarks/load_generator.py --url http://127.0.0.1:5001 --sessions 20
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+from common import BENCH_DIR, FIXTURES_DIR, environment_info, summarize, write_results
+from stub_server import StubServer
+
+DEBOUNCE_S = 1.0  # ChatWindow's debounce for text GIF suggestions
+MIN_TEXT_LENGTH = 3
+
+
+class Recorder:
+    """Thread-safe collection of per-endpoint request outcomes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}  # endpoint -> list of (latency seconds, status code)
+
+    def add(self, endpoint, latency, status):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append((latency, status))
+
+    def report(self, wall_time):
+        report = {}
+        with self.lock:
+            items = list(self.samples.items())
+        for endpoint, samples in sorted(items):
+            ok = [latency for latency, status in samples if 200 <= status < 300]
+            statuses = {}
+            for _, status in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            report[endpoint] = {
+                "requests": len(samples),
+                "succeeded": len(ok),
+                "statuses": statuses,
+                "throughput_rps": len(samples) / wall_time if wall_time else 0.0,
+                "latency": summarize(ok) if ok else None,
+            }
+        return report
+
+
+class ChatSession:
+    """One simulated conversation between two frontend windows."""
+
+    def __init__(self, base_url, transcript, recorder, args, rng):
+        self.base_url = base_url.rstrip("/")
+        self.transcript = transcript
+        self.recorder = recorder
+        self.args = args
+        self.rng = rng
+        self.http = requests.Session()
+        self.conversation_id = uuid.uuid4().hex
+        self.http.headers["X-Conversation-ID"] = self.conversation_id
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.args.speed)
+
+    def _post(self, endpoint, payload):
+        start = time.perf_counter()
+        try:
+            response = self.http.post(f"{self.base_url}/{endpoint}", json=payload, timeout=self.args.timeout)
+            status = response.status_code
+        except requests.RequestException:
+            status = 0  # connection error or timeout
+        self.recorder.add(endpoint, time.perf_counter() - start, status)
+
+    def _type(self, text):
+        """Types text word by word; pauses longer than the debounce fire a text GIF request."""
+        typed = ""
+        last_fetched = ""
+        for word in text.split():
+            typed = f"{typed} {word}".strip()
+            self._sleep(len(word) / self.args.typing_cps)
+            if self.rng.random() < self.args.pause_probability:
+                self._sleep(DEBOUNCE_S + self.rng.uniform(0, 1.5))
+                if len(typed) >= MIN_TEXT_LENGTH and typed != last_fetched:
+                    self._post("generate_text_gifs", {"message": typed})
+                    last_fetched = typed
+        return typed
+
+    def run(self):
+        for turn in self.transcript["turns"]:
+            self._sleep(self.rng.expovariate(1.0 / self.args.think_time))
+            text = self._type(turn["text"])
+            if turn["user"] == 2:
+                self._post("send_message_user2", {"message": text})
+            # The other user's window fetches reply GIFs for the new message
+            self._post("generate_reply_gifs", {"message": text})
+        self.http.close()
+
+
+def run_load(base_url, transcripts, args):
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    threads = []
+    start = time.perf_counter()
+    for index in range(args.sessions):
+        transcript = transcripts[index % len(transcripts)]
+        session = ChatSession(base_url, transcript, recorder, args, random.Random(rng.random()))
+        thread = threading.Thread(target=session.run, name=f"session-{index}", daemon=True)
+        thread.start()
+        threads.append(thread)
+        if index + 1 < args.sessions:
+            time.sleep(rng.expovariate(args.arrival_rate))
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+    return recorder.report(wall_time), wall_time
+
+
+def wait_for(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_local_stack(args):
+    """Starts the Giphy stub in-process and the app on model stand-ins in a subprocess."""
+    stub = StubServer(api_latency=args.api_latency_ms / 1000, cdn_latency=args.cdn_latency_ms / 1000).start()
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "serve_app.py"),
+        "--port", str(args.app_port), "--giphy-base-url", stub.giphy_base_url,
+    ]
+    if not args.real_models:
+        command.append("--stub-models")
+    # Every session comes from this host's address, so per-client rate limiting would throttle the whole run
+    app = subprocess.Popen(command, env=dict(os.environ, CLIENT_RATE_LIMIT_PER_S="0"))
+    try:
+        wait_for(f"http://127.0.0.1:{args.app_port}/", args.startup_timeout)
+    except Exception:
+        app.terminate()
+        stub.stop()
+        raise
+    return stub, app
+
+
+def print_report(report, wall_time):
+    print(f"\nWall time {wall_time:.1f}s")
+    print(f"{'endpoint':<22}{'reqs':>7}{'ok':>7}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in report.items():
+        latency = stats["latency"] or {"p50": float("nan"), "p95": float("nan"), "p99": float("nan")}
+        print(f"{endpoint:<22}{stats['requests']:>7}{stats['succeeded']:>7}{stats['throughput_rps']:>8.2f}"
+              f"{latency['p50'] * 1000:>10.1f}{latency['p95'] * 1000:>10.1f}{latency['p99'] * 1000:>10.1f}")
+        failures = {status: count for status, count in stats["statuses"].items() if not status.startswith("2")}
+        if failures:
+            print(f"{'':<22}non-2xx: {failures}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="App to test (ignored with --local)")
+    parser.add_argument("--transcripts", default=os.path.join(FIXTURES_DIR, "chat_transcripts.json"))
+    parser.add_argument("--sessions", type=int, default=20, help="Total chat sessions to run")
+    parser.add_argument("--arrival-rate", type=float, default=1.0, help="New sessions per second (Poisson)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Divide all human delays by this factor")
+    parser.add_argument("--typing-cps", type=float, default=6.0, help="Typing speed in characters per second")
+    parser.add_argument("--pause-probability", type=float, default=0.3,
+                        help="Chance of a debounce-length pause after each typed word")
+    parser.add_argument("--think-time", type=float, default=3.0, help="Mean seconds between turns")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--local", action="store_true", help="Start the Giphy stub and the app automatically")
+    parser.add_argument("--real-models", action="store_true", help="With --local, load the real models")
+    parser.add_argument("--app-port", type=int, default=5011)
+    parser.add_argument("--api-latency-ms", type=float, default=50.0, help="With --local, stub Giphy latency")
+    parser.add_argument("--cdn-latency-ms", type=float, default=20.0, help="With --local, stub CDN latency")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    with open(args.transcripts) as f:
+        transcripts = json.load(f)
+
+    stub = app = None
+    base_url = args.url
+    if args.local:
+        stub, app = start_local_stack(args)
+        base_url = f"http://127.0.0.1:{args.app_port}"
+    try:
+        report, wall_time = run_load(base_url, transcripts, args)
+    finally:
+        if app is not None:
+            app.terminate()
+            app.wait()
+        if stub is not None:
+            stub.stop()
+
+    print_report(report, wall_time)
+    if args.output:
+        write_results(args.output, {
+            "environment": environment_info(),
+            "config": vars(args),
+            "wall_time": wall_time,
+            "endpoints": report,
+        })
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+# benchmarks/run_benchmarks.py
+"""
+Microbenchmarks for the hot paths of the suggestion pipeline.
+
+Runs against the local Giphy/CDN stub and fixture GIFs, so results only
+depend on the code and the machine. Results are written as JSON; pass
+--compare with an earlier result file to see regressions between commits:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    git checkout my-branch
+    python benchmarks/run_benchmarks.py --compare before.json
+
+Benchmarks: vector_index_search, text_embedding, gif_embedding_local,
+gif_embedding_stub, analyze_message, get_gif_search_terms, key_phrases_legacy,
+key_phrases_fast, key_phrases_hf, key_phrases_loop, key_phrases_batch,
+hybrid_retrieval. The key_phrases_fast/hf benchmarks report in their params
+the fraction of messages whose output matches the legacy extractor's first
+phrases. key_phrases_loop and key_phrases_batch extract the same batch of
+typed message prefixes, one extract() call each and one extract_batch() call.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+from common import (
+    BENCH_DIR,
+    FIXTURE_GIF_DIR,
+    FIXTURES_DIR,
+    environment_info,
+    summarize,
+    time_calls,
+    write_results,
+)
+from fixture_gifs import ensure_fixture_gifs
+from stub_server import StubServer
+
+SAMPLE_MESSAGES = [
+    "I'm feeling excited and joyful today!",
+    "I feel so miserable.",
+    "What are you doing this weekend?",
+    "Thanks so much for the help, you're awesome",
+    "Sorry, I totally forgot about the meeting",
+    "Congrats on the new job!!",
+    "ugh this traffic is making me so angry",
+    "hey! long time no see",
+]
+
+
+class Rotating:
+    """Cycles through a list so repeated calls don't hit the same input every time."""
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.position = 0
+
+    def next(self):
+        item = self.items[self.position % len(self.items)]
+        self.position += 1
+        return item
+
+
+def bench_vector_index_search(args, context):
+    import numpy as np
+    from vector_index import VectorIndex
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.index_size, 512)).astype("float32")
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    index = VectorIndex(512)
+    index.index.add(embeddings)
+    index.metadata.extend(f"gif{i}" for i in range(args.index_size))
+    queries = Rotating(embeddings[rng.integers(0, args.index_size, 64)][:, None, :])
+    return lambda: index.search(queries.next(), top_k=6), {"index_size": args.index_size}
+
+
+def bench_hybrid_retrieval(args, context):
+    import numpy as np
+    from hybrid_retriever import HybridRetriever
+    from vector_index import VectorIndex
+
+    rng = np.random.default_rng(0)
+    vocabulary = ["happy", "sad", "dog", "cat", "dance", "party", "crying", "angry", "excited", "wow",
+                  "thumbs", "up", "facepalm", "laugh", "love", "hug", "bye", "hello", "thanks", "shrug"]
+    embeddings = rng.standard_normal((args.index_size, 512)).astype("float32")
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    metadata = [
+        {"id": str(i), "url": f"gif{i}.gif", "title": " ".join(rng.choice(vocabulary, 3)), "tags": []}
+        for i in range(args.index_size)
+    ]
+    index = VectorIndex(512)
+    index.add_embeddings(embeddings, metadata)
+    retriever = HybridRetriever(index)
+    cases = Rotating([
+        (["happy dance", "party", "excited"], embeddings[rng.integers(args.index_size)][None, :]),
+        (["sad", "crying", "reacting to bad day"], embeddings[rng.integers(args.index_size)][None, :]),
+        (["waving goodbye", "bye reaction"], embeddings[rng.integers(args.index_size)][None, :]),
+    ])
+
+    def run():
+        terms, embedding = cases.next()
+        retriever.search(terms, embedding, top_k=6)
+    return run, {"index_size": args.index_size, "candidates": retriever.candidates}
+
+
+def bench_text_embedding(args, context):
+    processor = context.text_processor()
+    messages = Rotating(SAMPLE_MESSAGES)
+    return lambda: processor.get_text_embedding(messages.next()), {}
+
+
+def bench_gif_embedding_local(args, context):
+    processor = context.gif_processor()
+    paths = Rotating(ensure_fixture_gifs(FIXTURE_GIF_DIR))
+    return lambda: processor.get_gif_embedding(paths.next()), {}
+
+
+def bench_gif_embedding_stub(args, context):
+    processor = context.gif_processor()
+    urls = Rotating(context.stub().gif_urls())
+    return lambda: processor.get_gif_embedding(urls.next()), {"cdn_latency_ms": args.cdn_latency_ms}
+
+
+def bench_analyze_message(args, context):
+    generator = context.reply_generator()
+    messages = Rotating(SAMPLE_MESSAGES)
+    return lambda: generator.analyze_message(messages.next()), {}
+
+
+def bench_get_gif_search_terms(args, context):
+    generator = context.reply_generator()
+    # Analyse once up front so only term generation is timed
+    cases = Rotating([
+        (message, generator.generate_reply(message)[1], is_reply)
+        for message in SAMPLE_MESSAGES for is_reply in (False, True)
+    ])
+
+    def run():
+        message, analysis, is_reply = cases.next()
+        generator.get_gif_search_terms(message, analysis, is_reply=is_reply)
+    return run, {}
+
+
+def key_phrase_messages():
+    """Sample messages plus every turn of the chat transcripts."""
+    with open(os.path.join(FIXTURES_DIR, "chat_transcripts.json")) as f:
+        transcripts = json.load(f)
+    return SAMPLE_MESSAGES + [turn["text"] for transcript in transcripts for turn in transcript["turns"]]
+
+
+def key_phrase_agreement(extractor, messages):
+    """Fraction of messages where the extractor returns the legacy extractor's first phrases."""
+    from key_phrases import legacy_key_phrases
+    limit = extractor.max_phrases
+    return statistics.fmean(extractor.extract(message) == legacy_key_phrases(message)[:limit]
+                            for message in messages)
+
+
+def bench_key_phrases_legacy(args, context):
+    context.nltk_data()
+    from key_phrases import legacy_key_phrases
+    messages = Rotating(key_phrase_messages())
+    return lambda: legacy_key_phrases(messages.next()), {}
+
+
+def bench_key_phrases_fast(args, context):
+    context.nltk_data()
+    from key_phrases import KeyPhraseExtractor
+    extractor = KeyPhraseExtractor(max_phrases=2)
+    messages = key_phrase_messages()
+    params = {"max_phrases": 2, "agreement": key_phrase_agreement(extractor, messages)}
+    messages = Rotating(messages)
+    return lambda: extractor.extract(messages.next()), params
+
+
+def bench_key_phrases_hf(args, context):
+    context.nltk_data()
+    from transformers import AutoTokenizer
+    from key_phrases import KeyPhraseExtractor
+    from model_store import EMOTION_MODEL
+    extractor = KeyPhraseExtractor(max_phrases=2, hf_tokenizer=AutoTokenizer.from_pretrained(EMOTION_MODEL))
+    messages = key_phrase_messages()
+    params = {"max_phrases": 2, "agreement": key_phrase_agreement(extractor, messages)}
+    messages = Rotating(messages)
+    return lambda: extractor.extract(messages.next()), params
+
+
+def key_phrase_typing_batch():
+    """Each sample message as it is typed: every word prefix, as the text GIF endpoint sees them."""
+    batch = []
+    for message in key_phrase_messages():
+        words = message.split()
+        batch.extend(" ".join(words[:n]) for n in range(1, len(words) + 1))
+    return batch
+
+
+def bench_key_phrases_loop(args, context):
+    context.nltk_data()
+    from key_phrases import KeyPhraseExtractor
+    extractor = KeyPhraseExtractor(max_phrases=2)
+    batch = key_phrase_typing_batch()
+    # The baseline for key_phrases_batch: the same messages, one extract() call each
+    return lambda: [extractor.extract(message) for message in batch], {"max_phrases": 2, "batch_size": len(batch)}
+
+
+def bench_key_phrases_batch(args, context):
+    context.nltk_data()
+    from key_phrases import KeyPhraseExtractor
+    extractor = KeyPhraseExtractor(max_phrases=2)
+    batch = key_phrase_typing_batch()
+    params = {
+        "max_phrases": 2,
+        "batch_size": len(batch),
+        "matches_extract": extractor.extract_batch(batch) == [extractor.extract(message) for message in batch],
+    }
+    return lambda: extractor.extract_batch(batch), params
+
+
+BENCHMARKS = {
+    "vector_index_search": bench_vector_index_search,
+    "hybrid_retrieval": bench_hybrid_retrieval,
+    "text_embedding": bench_text_embedding,
+    "gif_embedding_local": bench_gif_embedding_local,
+    "gif_embedding_stub": bench_gif_embedding_stub,
+    "analyze_message": bench_analyze_message,
+    "get_gif_search_terms": bench_get_gif_search_terms,
+    "key_phrases_legacy": bench_key_phrases_legacy,
+    "key_phrases_fast": bench_key_phrases_fast,
+    "key_phrases_hf": bench_key_phrases_hf,
+    "key_phrases_loop": bench_key_phrases_loop,
+    "key_phrases_batch": bench_key_phrases_batch,
+}
+
+
+class Context:
+    """Builds the models and the stub server lazily and shares them between benchmarks."""
+
+    def __init__(self, args):
+        self.args = args
+        self._cache = {}
+
+    def _get(self, key, factory):
+        if key not in self._cache:
+            self._cache[key] = factory()
+        return self._cache[key]
+
+    def text_processor(self):
+        from clip_module import TextProcessor
+        return self._get("text", lambda: TextProcessor(backend=self.args.clip_backend))
+
+    def gif_processor(self):
+        from gif_processor import GifProcessor
+        return self._get("gif", lambda: GifProcessor(backend=self.args.clip_backend))
+
+    def nltk_data(self):
+        def download():
+            import nltk
+            for resource in ("punkt", "averaged_perceptron_tagger", "averaged_perceptron_tagger_eng",
+                             "vader_lexicon"):
+                nltk.download(resource, quiet=True)
+            return True
+        return self._get("nltk", download)
+
+    def reply_generator(self):
+        def build():
+            self.nltk_data()
+            from reply_generator import ReplyGenerator
+            return ReplyGenerator()
+        return self._get("reply", build)
+
+    def stub(self):
+        return self._get("stub", lambda: StubServer(
+            cdn_latency=self.args.cdn_latency_ms / 1000, api_latency=self.args.api_latency_ms / 1000
+        ).start())
+
+    def close(self):
+        if "stub" in self._cache:
+            self._cache["stub"].stop()
+
+
+def compare(baseline, current, threshold):
+    """Prints p50 changes against a baseline result file; returns the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':<24}{'baseline p50':>16}{'current p50':>16}{'change':>10}")
+    for name, result in current["benchmarks"].items():
+        before = baseline.get("benchmarks", {}).get(name)
+        if before is None or "latency" not in result or "latency" not in before:
+            continue
+        old, new = before["latency"]["p50"], result["latency"]["p50"]
+        change = (new - old) / old if old else 0.0
+        marker = "  REGRESSION" if change > threshold else ""
+        print(f"{name:<24}{old * 1000:>14.3f}ms{new * 1000:>14.3f}ms{change:>+10.1%}{marker}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--index-size", type=int, default=100000,
+                        help="Vectors in the VectorIndex and hybrid retrieval benchmarks")
+    parser.add_argument("--clip-backend", default="eager", help="CLIP backend for the embedding benchmarks")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="Latency of the stub Giphy API")
+    parser.add_argument("--cdn-latency-ms", type=float, default=0.0, help="Latency of the stub GIF CDN")
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "results", "latest.json"))
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    parser.add_argument("--regression-threshold", type=float, default=0.10,
+                        help="Relative p50 slowdown reported as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    context = Context(args)
+    results = {"environment": environment_info(), "config": vars(args), "benchmarks": {}}
+    try:
+        for name in args.only or list(BENCHMARKS):
+            print(f"Running {name}...", flush=True)
+            try:
+                run, params = BENCHMARKS[name](args, context)
+                durations = time_calls(run, args.iterations, args.warmup)
+            except ImportError as e:
+                print(f"  skipped: {e}")
+                results["benchmarks"][name] = {"skipped": str(e)}
+                continue
+            latency = summarize(durations)
+            results["benchmarks"][name] = {
+                "params": params,
+                "latency": latency,
+                "ops_per_second": 1.0 / latency["mean"],
+            }
+            print(f"  p50 {latency['p50'] * 1000:.3f}ms  p95 {latency['p95'] * 1000:.3f}ms  "
+                  f"{1.0 / latency['mean']:.1f} ops/s")
+    finally:
+        context.close()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    write_results(args.output, results)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.regression_threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
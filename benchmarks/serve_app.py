@@ -0,0 +1,43 @@
+# benchmarks/serve_app.py
+"""
+Runs the Flask app for load testing, optionally on model stand-ins.
+
+    python benchmarks/serve_app.py --port 5001 --stub-models \
+        --giphy-base-url http://127.0.0.1:5055/v1/gifs
+
+With --stub-models the CLIP model and the Hugging Face pipelines are
+replaced by benchmarks/stub_models.py, so only the serving path (queues,
+batching, Giphy calls, GIF downloads and decoding, ranking) is measured.
+"""
+import argparse
+import os
+
+from common import SRC_DIR  # noqa: F401  (puts src/ on sys.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--giphy-base-url", help="Sets GIPHY_BASE_URL, e.g. the stub server")
+    parser.add_argument("--stub-models", action="store_true", help="Use lightweight model stand-ins")
+    parser.add_argument("--clip-batch-ms", type=float, default=5.0, help="Stand-in CLIP cost per batch")
+    parser.add_argument("--clip-item-ms", type=float, default=2.0, help="Stand-in CLIP cost per item")
+    parser.add_argument("--classifier-batch-ms", type=float, default=10.0, help="Stand-in pipeline cost per batch")
+    parser.add_argument("--classifier-item-ms", type=float, default=3.0, help="Stand-in pipeline cost per item")
+    args = parser.parse_args()
+
+    # config.py reads the environment at import time, so set it before importing the app
+    if args.giphy_base_url:
+        os.environ["GIPHY_BASE_URL"] = args.giphy_base_url
+    if args.stub_models:
+        import stub_models
+        stub_models.install(args.clip_batch_ms, args.clip_item_ms,
+                            args.classifier_batch_ms, args.classifier_item_ms)
+
+    import main as app_module
+    app_module.app.run(host=args.host, port=args.port, threaded=True, use_reloader=False)
+
+
+if __name__ == "__main__":
+    main()
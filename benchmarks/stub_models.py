@@ -0,0 +1,123 @@
+# benchmarks/stub_models.py
+"""
+Lightweight stand-ins for the CLIP model and the Hugging Face pipelines.
+
+install() patches open_clip and transformers so that TextProcessor,
+GifProcessor and ReplyGenerator run their real code paths (tokenizing,
+frame decoding, batching, ranking, NLTK analysis) on top of tiny
+deterministic models. Each forward pass sleeps for a configurable
+per-batch + per-item time to mimic CPU inference cost, so load tests
+exercise queueing and batching without downloading any weights.
+"""
+import hashlib
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+EMBED_DIM = 512
+CONTEXT_LENGTH = 77
+IMAGE_SIZE = 32
+VOCAB_SIZE = 4096
+
+EMOTION_LABELS = ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"]
+# bart-large-mnli used as a text classifier reports its NLI labels
+INTENT_LABELS = ["contradiction", "neutral", "entailment"]
+
+
+def _stable_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def _simulate(per_batch, per_item, batch_size):
+    delay = per_batch + per_item * batch_size
+    if delay > 0:
+        time.sleep(delay)
+
+
+class StubTokenizer:
+    """Maps words to hashed token ids, padded to CLIP's context length."""
+
+    def __call__(self, texts):
+        tokens = torch.zeros(len(texts), CONTEXT_LENGTH, dtype=torch.long)
+        for row, text in enumerate(texts):
+            ids = [_stable_hash(word) % (VOCAB_SIZE - 1) + 1 for word in text.lower().split()][:CONTEXT_LENGTH]
+            if ids:
+                tokens[row, :len(ids)] = torch.tensor(ids)
+        return tokens
+
+
+def stub_preprocess(image):
+    """Downsamples a PIL frame to a small (3, IMAGE_SIZE, IMAGE_SIZE) float tensor."""
+    array = np.asarray(image.convert("RGB").resize((IMAGE_SIZE, IMAGE_SIZE)), dtype=np.float32) / 255.0
+    return torch.from_numpy(array).permute(2, 0, 1).contiguous()
+
+
+class StubClipModel(nn.Module):
+    """Fixed random projections standing in for CLIP's text and image towers."""
+
+    def __init__(self, per_batch=0.0, per_item=0.0):
+        super().__init__()
+        generator = torch.Generator().manual_seed(0)
+        self.token_table = nn.Parameter(torch.randn(VOCAB_SIZE, EMBED_DIM, generator=generator), requires_grad=False)
+        self.image_projection = nn.Parameter(
+            torch.randn(3 * IMAGE_SIZE * IMAGE_SIZE, EMBED_DIM, generator=generator), requires_grad=False
+        )
+        self.per_batch = per_batch
+        self.per_item = per_item
+
+    def encode_text(self, tokens):
+        _simulate(self.per_batch, self.per_item, tokens.shape[0])
+        mask = (tokens > 0).unsqueeze(-1).float()
+        summed = (self.token_table[tokens] * mask).sum(dim=1)
+        return summed / mask.sum(dim=1).clamp(min=1.0)
+
+    def encode_image(self, images):
+        _simulate(self.per_batch, self.per_item, images.shape[0])
+        return images.flatten(1) @ self.image_projection
+
+
+class StubClassifier:
+    """Callable like a text-classification pipeline with return_all_scores=True."""
+
+    def __init__(self, labels, per_batch=0.0, per_item=0.0):
+        self.labels = labels
+        self.per_batch = per_batch
+        self.per_item = per_item
+
+    def _scores(self, text):
+        weights = np.random.default_rng(_stable_hash(text)).random(len(self.labels))
+        weights /= weights.sum()
+        return [{"label": label, "score": float(score)} for label, score in zip(self.labels, weights)]
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        _simulate(self.per_batch, self.per_item, len(texts))
+        return [self._scores(text) for text in texts]
+
+
+def install(clip_batch_ms=5.0, clip_item_ms=2.0, classifier_batch_ms=10.0, classifier_item_ms=3.0):
+    """
+    Patches open_clip and transformers.pipeline with the stand-ins.
+    Must run before clip_module, gif_processor or reply_generator are imported.
+    """
+    import open_clip
+    import transformers
+
+    clip_cost = (clip_batch_ms / 1000, clip_item_ms / 1000)
+    classifier_cost = (classifier_batch_ms / 1000, classifier_item_ms / 1000)
+
+    def create_model_and_transforms(*args, **kwargs):
+        return StubClipModel(*clip_cost), stub_preprocess, stub_preprocess
+
+    def get_tokenizer(*args, **kwargs):
+        return StubTokenizer()
+
+    def pipeline(task, model=None, **kwargs):
+        labels = EMOTION_LABELS if model and "emotion" in model else INTENT_LABELS
+        return StubClassifier(labels, *classifier_cost)
+
+    open_clip.create_model_and_transforms = create_model_and_transforms
+    open_clip.get_tokenizer = get_tokenizer
+    transformers.pipeline = pipeline
@@ -0,0 +1,242 @@
+# benchmarks/stub_server.py
+"""
+Local stand-in for the Giphy API and its GIF CDN.
+
+Serves search/trending JSON and generated fixture GIFs, with configurable
+latency, so the app and the benchmarks can run without network access:
+
+    python benchmarks/stub_server.py --port 5055 --api-latency-ms 80 --cdn-latency-ms 40
+    GIPHY_BASE_URL=http://127.0.0.1:5055/v1/gifs python src/main.py
+
+Responses come from two directories:
+
+  * benchmarks/fixtures/giphy_synthetic: hand-written responses with a few
+    fields per GIF. They are synthetic: payloads are much smaller than real
+    Giphy responses and every GIF is a generated fixture.
+  * benchmarks/fixtures/giphy_recorded: live responses captured with
+    --record. A recorded file replaces the synthetic file of the same name.
+
+Responses use "{media}" in GIF URLs; it is replaced with this server's
+/media prefix. search_<query>.json is served for a matching query,
+search_default.json otherwise.
+
+    python benchmarks/stub_server.py --record happy sad default --api-key $GIPHY_API_KEY
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from common import FIXTURE_GIF_DIR, FIXTURES_DIR
+from fixture_gifs import ensure_fixture_gifs
+
+SYNTHETIC_DIR = os.path.join(FIXTURES_DIR, "giphy_synthetic")
+RECORDINGS_DIR = os.path.join(FIXTURES_DIR, "giphy_recorded")
+# Rendition URLs in live responses, rewritten to fixture GIFs by --record
+_RENDITION_URL_KEYS = ("url", "mp4", "webp")
+
+
+def recording_name(query):
+    """File name of the stored search response for a query."""
+    return "search_" + re.sub(r"[^a-z0-9]+", "_", query.lower()).strip("_") + ".json"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _delay(self, latency, jitter):
+        if latency or jitter:
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        server = self.server
+        if parsed.path == "/v1/gifs/search":
+            self._delay(server.api_latency, server.api_jitter)
+            self._send_recording(server.search_recording(params.get("q", "")), params)
+        elif parsed.path == "/v1/gifs/trending":
+            self._delay(server.api_latency, server.api_jitter)
+            self._send_recording(server.recording("trending.json"), params)
+        elif parsed.path.startswith("/media/"):
+            self._delay(server.cdn_latency, server.cdn_jitter)
+            name = os.path.basename(parsed.path)
+            data = server.gifs.get(name)
+            if data is None:
+                self._send(404, b"not found", "text/plain")
+            else:
+                self._send(200, data, "image/gif")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def _send_recording(self, recording, params):
+        if recording is None:
+            self._send(404, b'{"data": []}', "application/json")
+            return
+        limit = int(params.get("limit", 25))
+        payload = dict(recording, data=recording["data"][:limit])
+        body = json.dumps(payload).replace("{media}", self.server.media_url).encode()
+        self._send(200, body, "application/json")
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Giphy + CDN stand-in. Latencies are in seconds; each response is delayed
+    by latency +/- a uniformly random jitter. Recorded responses take
+    precedence over synthetic ones with the same name.
+    """
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, api_latency=0.0, api_jitter=0.0,
+                 cdn_latency=0.0, cdn_jitter=0.0, recordings_dir=RECORDINGS_DIR,
+                 synthetic_dir=SYNTHETIC_DIR, gif_dir=FIXTURE_GIF_DIR, verbose=False):
+        super().__init__((host, port), StubHandler)
+        self.api_latency, self.api_jitter = api_latency, api_jitter
+        self.cdn_latency, self.cdn_jitter = cdn_latency, cdn_jitter
+        self.verbose = verbose
+        self.recordings = {}
+        for directory in (synthetic_dir, recordings_dir):
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith(".json"):
+                    with open(os.path.join(directory, name)) as f:
+                        self.recordings[name] = json.load(f)
+        self.gifs = {}
+        for path in ensure_fixture_gifs(gif_dir):
+            with open(path, "rb") as f:
+                self.gifs[os.path.basename(path)] = f.read()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def giphy_base_url(self):
+        """Value for GIPHY_BASE_URL / GiphyAPI(base_url=...)."""
+        return self.base_url + "/v1/gifs"
+
+    @property
+    def media_url(self):
+        return self.base_url + "/media"
+
+    def recording(self, name):
+        return self.recordings.get(name)
+
+    def search_recording(self, query):
+        return self.recordings.get(recording_name(query)) or self.recordings.get("search_default.json")
+
+    def gif_urls(self):
+        return [f"{self.media_url}/{name}" for name in sorted(self.gifs)]
+
+    def start(self):
+        """Serve on a background thread; returns self so it can be used inline."""
+        self._thread = threading.Thread(target=self.serve_forever, name="giphy-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _rewrite_media(payload, fixture_names):
+    """Points every rendition URL at a fixture GIF under "{media}", cycling through fixture_names."""
+    for index, gif in enumerate(payload.get("data", [])):
+        fixture = fixture_names[index % len(fixture_names)]
+        for rendition in gif.get("images", {}).values():
+            for key in _RENDITION_URL_KEYS:
+                if key in rendition:
+                    rendition[key] = f"{{media}}/{fixture}"
+    return payload
+
+
+def record(api_key, queries, recordings_dir=RECORDINGS_DIR, limit=25, keep_media_urls=False):
+    """
+    Captures live Giphy search responses (and trending) into recordings_dir.
+    Everything but the GIF URLs is kept as captured. The URLs are rewritten to
+    the fixture GIFs so replays stay offline, unless keep_media_urls is set
+    (replays then download from the live CDN).
+    """
+    import requests
+    os.makedirs(recordings_dir, exist_ok=True)
+    fixture_names = [os.path.basename(path) for path in ensure_fixture_gifs(FIXTURE_GIF_DIR)]
+    base = "https://api.giphy.com/v1/gifs"
+    targets = [("trending.json", f"{base}/trending", {"api_key": api_key, "limit": limit, "rating": "pg"})]
+    for query in queries:
+        targets.append((recording_name(query), f"{base}/search",
+                        {"api_key": api_key, "q": query, "limit": limit, "rating": "pg", "lang": "en"}))
+    for name, url, params in targets:
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        payload = response.json()
+        if not keep_media_urls:
+            payload = _rewrite_media(payload, fixture_names)
+        with open(os.path.join(recordings_dir, name), "w") as f:
+            json.dump(payload, f, indent=1)
+        print(f"Recorded {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--api-latency-ms", type=float, default=0.0)
+    parser.add_argument("--api-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--cdn-latency-ms", type=float, default=0.0)
+    parser.add_argument("--cdn-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--record", nargs="+", metavar="QUERY",
+                        help="Record live Giphy responses for these queries instead of serving")
+    parser.add_argument("--api-key", help="Giphy API key, required with --record")
+    parser.add_argument("--keep-media-urls", action="store_true",
+                        help="With --record, keep the live GIF URLs instead of pointing them at fixture GIFs")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.api_key:
+            parser.error("--record needs --api-key")
+        record(args.api_key, args.record, keep_media_urls=args.keep_media_urls)
+        return
+
+    server = StubServer(
+        args.host, args.port,
+        api_latency=args.api_latency_ms / 1000, api_jitter=args.api_jitter_ms / 1000,
+        cdn_latency=args.cdn_latency_ms / 1000, cdn_jitter=args.cdn_jitter_ms / 1000,
+        verbose=args.verbose
+    )
+    print(f"Giphy stub serving on {server.base_url} (GIPHY_BASE_URL={server.giphy_base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import axios from 'axios'
 
 function App() {
   const [messages, setMessages] = useState<Message[]>([])
+  // One conversation per chat, so the backend keeps its context apart from other chats
+  const [conversationId] = useState(() => crypto.randomUUID())
 
   const handleSendMessage = async (userId: 1 | 2, text: string, gifUrl?: string) => {
     // Add the message to the chat
@@ -21,6 +23,7 @@ function App() {
       try {
         await axios.post('http://localhost:5001/send_message_user2', {
           message: text,
+          conversation_id: conversationId,
         })
       } catch (error) {
         console.error('Error sending message to backend:', error)
@@ -39,6 +42,7 @@ function App() {
       <GridItem>
         <ChatWindow
           userId={1}
+          conversationId={conversationId}
           messages={messages}
           onSendMessage={(text, gifUrl) => handleSendMessage(1, text, gifUrl)}
         />
@@ -46,6 +50,7 @@ function App() {
       <GridItem>
         <ChatWindow
           userId={2}
+          conversationId={conversationId}
           messages={messages}
           onSendMessage={(text, gifUrl) => handleSendMessage(2, text, gifUrl)}
         />
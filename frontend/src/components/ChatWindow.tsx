@@ -21,11 +21,12 @@ import { FaGift, FaPaperPlane } from 'react-icons/fa';
 
 interface ChatWindowProps {
   userId: 1 | 2;
+  conversationId: string;
   messages: Message[];
   onSendMessage: (message: string, gifUrl?: string) => void;
 }
 
-export const ChatWindow = ({ userId, messages, onSendMessage }: ChatWindowProps) => {
+export const ChatWindow = ({ userId, conversationId, messages, onSendMessage }: ChatWindowProps) => {
   const [inputMessage, setInputMessage] = useState('');
   const [suggestedGifs, setSuggestedGifs] = useState<string[]>([]);
   const [replyGifs, setReplyGifs] = useState<string[]>([]);
@@ -44,7 +45,8 @@ export const ChatWindow = ({ userId, messages, onSendMessage }: ChatWindowProps)
     try {
       console.log('Fetching text GIFs for:', text);
       const response = await axios.post('http://localhost:5001/generate_text_gifs', {
-        message: text
+        message: text,
+        conversation_id: conversationId
       });
       
       if (response.data.suggested_gifs && response.data.suggested_gifs.length > 0) {
@@ -61,7 +63,7 @@ export const ChatWindow = ({ userId, messages, onSendMessage }: ChatWindowProps)
     } finally {
       setIsLoadingGifs(false);
     }
-  }, [lastFetchedText]);
+  }, [lastFetchedText, conversationId]);
 
   // Function to fetch reply GIF suggestions
   const fetchReplyGifs = useCallback(async (text: string) => {
@@ -71,7 +73,8 @@ export const ChatWindow = ({ userId, messages, onSendMessage }: ChatWindowProps)
     try {
       console.log('Fetching reply GIFs for:', text);
       const response = await axios.post('http://localhost:5001/generate_reply_gifs', {
-        message: text
+        message: text,
+        conversation_id: conversationId
       });
       
       if (response.data.suggested_gifs && response.data.suggested_gifs.length > 0) {
@@ -88,7 +91,7 @@ export const ChatWindow = ({ userId, messages, onSendMessage }: ChatWindowProps)
     } finally {
       setIsLoadingReplyGifs(false);
     }
-  }, [lastFetchedReply]);
+  }, [lastFetchedReply, conversationId]);
 
   // Get GIF suggestions when receiving a new message
   useEffect(() => {
@@ -40,8 +40,9 @@ export const GifPanel = ({ gifs = [], isLoading = false, mode = 'display', onGif
 
     setIsSearching(true);
     try {
-      const response = await axios.post('http://localhost:5001/search_gifs', {
-        query: query
+      // GET so repeated queries can be answered from the browser cache or with a 304
+      const response = await axios.get('http://localhost:5001/search_gifs', {
+        params: { q: query }
       });
       
       if (response.data.gifs) {
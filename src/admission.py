@@ -0,0 +1,147 @@
+# src/admission.py
+import threading
+import time
+from contextlib import contextmanager
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed by admission control."""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of in-flight requests for one endpoint.
+    Acquiring never blocks: a request over the limit is rejected straight away.
+    """
+
+    def __init__(self, name, max_concurrent, degrade_at=None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        # Requests admitted beyond this many in flight run in degraded mode
+        self.degrade_at = degrade_at if degrade_at is not None else max_concurrent
+        self.in_flight = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a slot if one is free. Returns the in-flight count including this request, or None."""
+        with self._lock:
+            if self.in_flight >= self.max_concurrent:
+                self.shed += 1
+                return None
+            self.in_flight += 1
+            return self.in_flight
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class RateLimiter:
+    """Token bucket per client: `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = {}  # client_id -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def try_acquire(self, client_id):
+        """
+        Take one token for the client.
+        Returns 0 if allowed, otherwise the number of seconds until a token is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(client_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[client_id] = (tokens - 1, now)
+                allowed = True
+            else:
+                self._buckets[client_id] = (tokens, now)
+                allowed = False
+            if len(self._buckets) > self.max_clients:
+                self._evict_full_buckets(now)
+        if allowed:
+            return 0
+        return (1 - tokens) / self.rate
+
+    def _evict_full_buckets(self, now):
+        """Drop clients whose bucket has refilled completely; they are indistinguishable from new ones."""
+        for client_id, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * self.rate >= self.burst:
+                del self._buckets[client_id]
+
+
+class AdmissionController:
+    """
+    Per-endpoint concurrency limits, per-client rate limits and overload detection.
+
+    pressure_fn, if given, returns the current load of the inference backend
+    as a fraction of its capacity (0.0 - 1.0); at or above degrade_pressure the
+    admitted requests run in degraded mode.
+    """
+
+    def __init__(self, rate_limiter=None, pressure_fn=None, degrade_pressure=0.5, retry_after=1):
+        self.rate_limiter = rate_limiter
+        self.pressure_fn = pressure_fn
+        self.degrade_pressure = degrade_pressure
+        self.retry_after = retry_after
+        self.limiters = {}
+        self.rate_limited = 0
+
+    def add_endpoint(self, name, max_concurrent, degrade_at=None):
+        self.limiters[name] = ConcurrencyLimiter(name, max_concurrent, degrade_at)
+
+    @contextmanager
+    def admit(self, endpoint, client_id):
+        """
+        Admit one request or raise OverloadedError.
+        Yields True if the request should run in degraded mode.
+        """
+        # Concurrency is checked first so a request shed for load doesn't spend the client's rate quota
+        limiter = self.limiters.get(endpoint)
+        in_flight = None
+        if limiter is not None:
+            in_flight = limiter.try_acquire()
+            if in_flight is None:
+                raise OverloadedError(f"Too many concurrent {endpoint} requests",
+                                      retry_after=self.retry_after)
+        try:
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.try_acquire(client_id)
+                if wait:
+                    self.rate_limited += 1
+                    raise OverloadedError(f"Rate limit exceeded for client {client_id}",
+                                          retry_after=max(1, int(wait + 0.999)))
+            if limiter is None:
+                yield False
+            else:
+                yield in_flight > limiter.degrade_at or self._under_pressure()
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+    def _under_pressure(self):
+        return self.pressure_fn is not None and self.pressure_fn() >= self.degrade_pressure
+
+    def stats(self):
+        return {
+            "rate_limited": self.rate_limited,
+            "endpoints": {
+                name: {
+                    "in_flight": limiter.in_flight,
+                    "max_concurrent": limiter.max_concurrent,
+                    "degrade_at": limiter.degrade_at,
+                    "shed": limiter.shed,
+                }
+                for name, limiter in self.limiters.items()
+            },
+        }
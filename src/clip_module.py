@@ -2,18 +2,43 @@
 import torch
 import open_clip
 
+from clip_optimize import TextEncoder, build_encoder
+from model_store import load_clip
+
 class TextProcessor:
-    def __init__(self, model_name="ViT-B/32"):
+    def __init__(self, model_name="ViT-B/32", backend="eager", artifact_dir=None, num_threads=0, clip=None):
+        """
+        backend selects the text encoder implementation (see clip_optimize.BACKENDS);
+        optimized backends are CPU-only and cache their artifacts in artifact_dir.
+        clip: a (model, preprocess) pair from model_store.load_clip, so the text and image
+        processors can share one CLIP model; loaded here when not given. The int8 backends
+        quantize their tower of this model in place.
+        """
         self.device = "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu"
         print(f"Device set to use {self.device}")
-        self.model, _, self.preprocess = open_clip.create_model_and_transforms('ViT-B-32', pretrained='openai')
+        if clip is None:
+            clip = load_clip()
+        self.model, self.preprocess = clip
         self.model = self.model.to(self.device)
         self.tokenizer = open_clip.get_tokenizer('ViT-B-32')
+        self.backend = backend
+        self.encode_text = build_encoder(
+            TextEncoder(self.model), "ViT-B-32-text", backend,
+            example_input=self.tokenizer(["a reaction gif", "hello"]).to(self.device),
+            artifact_dir=artifact_dir, num_threads=num_threads, device=self.device
+        )
 
     def get_text_embedding(self, text):
+        return self.get_text_embeddings([text])
+
+    def get_text_embeddings(self, texts):
+        """
+        Encodes a batch of texts in a single forward pass.
+        Returns a tensor of shape (len(texts), embed_dim) with normalized rows.
+        """
         with torch.no_grad():
-            text_tokens = self.tokenizer([text]).to(self.device)
-            text_features = self.model.encode_text(text_tokens)
+            text_tokens = self.tokenizer(list(texts)).to(self.device)
+            text_features = self.encode_text(text_tokens)
             text_features = text_features / text_features.norm(dim=-1, keepdim=True)
         return text_features
 
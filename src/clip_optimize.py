@@ -0,0 +1,174 @@
+# src/clip_optimize.py
+import os
+import hashlib
+import logging
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+# "eager" is the stock fp32 model; the others trade a little accuracy or warm-up time for CPU speed.
+# Use validate_clip_backend.py to check ranking agreement before enabling one.
+BACKENDS = ("eager", "int8", "torchscript", "int8-torchscript", "compile", "onnx")
+
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "auto-gif-search", "clip")
+
+
+class TextEncoder(nn.Module):
+    """Exposes CLIP's text tower as a plain forward() so it can be traced or exported."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def tower(self):
+        """The submodule holding the text tower's nn.Linear layers."""
+        return self.model.transformer
+
+    def weights(self):
+        """(name, parameter) pairs read by forward(): everything outside the image tower."""
+        return [(n, p) for n, p in self.model.named_parameters() if not n.startswith("visual.")]
+
+    def forward(self, tokens):
+        return self.model.encode_text(tokens)
+
+
+class ImageEncoder(nn.Module):
+    """Exposes CLIP's image tower as a plain forward() so it can be traced or exported."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def tower(self):
+        """The submodule holding the image tower's nn.Linear layers."""
+        return self.model.visual
+
+    def weights(self):
+        """(name, parameter) pairs read by forward()."""
+        return list(self.model.visual.named_parameters())
+
+    def forward(self, images):
+        return self.model.encode_image(images)
+
+
+def quantize_int8(encoder):
+    """
+    Dynamic int8 quantization of the nn.Linear layers in one CLIP tower (weights int8,
+    activations quantized per batch). The tower is quantized in place, so the shared
+    CLIP model is changed for every user of it; without inplace, quantize_dynamic would
+    deep-copy the whole model, both towers and any memory-mapped weights included.
+    Quantizing a tower that is already quantized does nothing.
+    """
+    torch.quantization.quantize_dynamic(encoder.tower(), {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return encoder
+
+
+def weights_fingerprint(encoder):
+    """
+    A short hash of the weights an encoder runs, so an artifact traced from other weights
+    (a different checkpoint or a re-prepared MODEL_DIR) is never reused. Only the encoder's
+    own tower is hashed: the other tower may have been quantized in place meanwhile.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for name, param in encoder.weights():
+        digest.update(f"{name}:{tuple(param.shape)}:{param.dtype};".encode())
+        digest.update(param.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy())
+    return digest.hexdigest()
+
+
+def _artifact_path(artifact_dir, name, backend, extension, fingerprint):
+    # Key artifacts on the torch version too: TorchScript/ONNX exports are not portable across releases
+    version = torch.__version__.split("+")[0]
+    return os.path.join(artifact_dir, f"{name}-{backend}-{fingerprint}-torch{version}.{extension}")
+
+
+def _torchscript(module, example_input, path, prepare=None):
+    """
+    Load a cached TorchScript artifact, or trace the module and cache it.
+    prepare, if given, transforms the module just before tracing, so a cached load skips it.
+    """
+    if os.path.exists(path):
+        logger.info(f"Loading TorchScript encoder from {path}")
+        return torch.jit.load(path)
+    if prepare is not None:
+        module = prepare(module)
+    with torch.no_grad():
+        traced = torch.jit.trace(module, example_input)
+        traced = torch.jit.freeze(traced.eval())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    traced.save(path)
+    logger.info(f"Saved TorchScript encoder to {path}")
+    return traced
+
+
+class OnnxEncoder:
+    """Runs an exported encoder with onnxruntime, returning torch tensors like the eager model."""
+
+    def __init__(self, path, num_threads=0):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The 'onnx' CLIP backend needs onnxruntime: pip install onnxruntime")
+        options = onnxruntime.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, inputs):
+        outputs = self.session.run(None, {self.input_name: inputs.cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+
+def _onnx(module, example_input, path, num_threads):
+    """Load a cached ONNX artifact, or export the module and cache it."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with torch.no_grad():
+            torch.onnx.export(
+                module, (example_input,), path,
+                input_names=["input"], output_names=["embedding"],
+                dynamic_axes={"input": {0: "batch"}, "embedding": {0: "batch"}},
+                opset_version=14
+            )
+        logger.info(f"Exported ONNX encoder to {path}")
+    return OnnxEncoder(path, num_threads)
+
+
+def build_encoder(module, name, backend="eager", example_input=None,
+                  artifact_dir=None, num_threads=0, device="cpu"):
+    """
+    Wraps one CLIP tower (a TextEncoder or ImageEncoder) for the requested backend.
+    Returns a callable mapping a batch of inputs to unnormalized embeddings.
+
+    example_input is a representative batch, needed for tracing and ONNX export.
+    Compiled artifacts are cached in artifact_dir so later starts skip the export.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown CLIP backend '{backend}', expected one of {BACKENDS}")
+    module = module.eval()
+    if backend == "eager":
+        return module
+    if device != "cpu":
+        logger.warning(f"CLIP backend '{backend}' is CPU-only; using eager mode on {device}")
+        return module
+
+    if backend == "int8":
+        return quantize_int8(module)
+    if backend == "compile":
+        return torch.compile(module)
+
+    # Fingerprint before any quantization, so the key is the same whether or not the artifact exists
+    artifact_dir = artifact_dir or DEFAULT_ARTIFACT_DIR
+    fingerprint = weights_fingerprint(module)
+    if backend == "torchscript":
+        return _torchscript(module, example_input, _artifact_path(artifact_dir, name, backend, "pt", fingerprint))
+    if backend == "int8-torchscript":
+        # Quantize only when tracing: a cached artifact already holds the int8 weights, and the
+        # shared CLIP model must stay fp32 for anything else using it
+        return _torchscript(module, example_input, _artifact_path(artifact_dir, name, backend, "pt", fingerprint),
+                            prepare=quantize_int8)
+    return _onnx(module, example_input, _artifact_path(artifact_dir, name, backend, "onnx", fingerprint),
+                 num_threads)
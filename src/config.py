@@ -0,0 +1,123 @@
+# src/config.py
+import os
+
+
+def _env_int(name, default):
+    """Read an integer setting from the environment, falling back to default."""
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name, default):
+    """Read a float setting from the environment, falling back to default."""
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    """Read a boolean setting ("1", "true", "yes", "on") from the environment."""
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_str(name, default):
+    """Read a string setting from the environment, falling back to default."""
+    value = os.environ.get(name)
+    return value if value not in (None, "") else default
+
+
+# Giphy: point GIPHY_BASE_URL at benchmarks/stub_server.py to run without the live API
+GIPHY_API_KEY = _env_str("GIPHY_API_KEY", "GlVGYHkr3WSBnllca54iNt0yFbjz7L65")  # development key
+GIPHY_BASE_URL = _env_str("GIPHY_BASE_URL", "https://api.giphy.com/v1/gifs")
+
+# Logging: per-request INFO lines are sampled; warnings and errors are always logged
+LOG_LEVEL = _env_str("LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = _env_float("LOG_SAMPLE_RATE", 0.05)
+
+# Inference workers: every model gets a single inference thread fed by a bounded queue.
+TORCH_NUM_THREADS = _env_int("TORCH_NUM_THREADS", 0)  # 0 splits the CPUs between the inference threads
+INFERENCE_MAX_BATCH_SIZE = _env_int("INFERENCE_MAX_BATCH_SIZE", 32)
+INFERENCE_MAX_WAIT_MS = _env_float("INFERENCE_MAX_WAIT_MS", 5.0)
+INFERENCE_QUEUE_SIZE = _env_int("INFERENCE_QUEUE_SIZE", 256)
+INFERENCE_TIMEOUT_S = _env_float("INFERENCE_TIMEOUT_S", 30.0)
+INFERENCE_RETRY_AFTER_S = _env_int("INFERENCE_RETRY_AFTER_S", 1)
+
+# CLIP encoder backend: eager, int8, torchscript, int8-torchscript, compile or onnx (see clip_optimize.py)
+CLIP_BACKEND = _env_str("CLIP_BACKEND", "eager")
+CLIP_ARTIFACT_DIR = _env_str("CLIP_ARTIFACT_DIR", None)  # None uses ~/.cache/auto-gif-search/clip
+# Directory written by "python src/model_store.py prepare"; models are memory-mapped from it when set
+MODEL_DIR = _env_str("MODEL_DIR", None)
+
+# Admission control for the suggestion and search endpoints
+ADMISSION_ENABLED = _env_bool("ADMISSION_ENABLED", True)
+SUGGEST_MAX_CONCURRENT = _env_int("SUGGEST_MAX_CONCURRENT", 8)  # per suggestion endpoint
+SUGGEST_DEGRADE_AT = _env_int("SUGGEST_DEGRADE_AT", 4)  # in-flight requests before CLIP re-ranking is skipped
+SEARCH_MAX_CONCURRENT = _env_int("SEARCH_MAX_CONCURRENT", 8)
+SEARCH_DEGRADE_AT = _env_int("SEARCH_DEGRADE_AT", 4)
+# Per-endpoint overrides, e.g. STREAM_REPLY_MAX_CONCURRENT=2; unset ones use the SUGGEST_* limits
+SUGGEST_ENDPOINT_LIMITS = {
+    endpoint: (_env_int(f"{endpoint.upper()}_MAX_CONCURRENT", SUGGEST_MAX_CONCURRENT),
+               _env_int(f"{endpoint.upper()}_DEGRADE_AT", SUGGEST_DEGRADE_AT))
+    for endpoint in ("generate_reply_and_gifs", "generate_reply_gifs", "generate_text_gifs", "stream_reply")
+}
+CLIENT_RATE_LIMIT_PER_S = _env_float("CLIENT_RATE_LIMIT_PER_S", 5.0)  # 0 disables per-client limits
+CLIENT_RATE_LIMIT_BURST = _env_int("CLIENT_RATE_LIMIT_BURST", 20)
+# Reverse proxies in front of the app; their X-Forwarded-For entries identify the client (0 trusts none)
+TRUSTED_PROXY_COUNT = _env_int("TRUSTED_PROXY_COUNT", 0)
+DEGRADE_QUEUE_FRACTION = _env_float("DEGRADE_QUEUE_FRACTION", 0.5)  # inference queue fill that triggers degraded mode
+SHED_RETRY_AFTER_S = _env_int("SHED_RETRY_AFTER_S", 1)
+
+# Per-conversation session store: "memory" (per process) or "sqlite" (shared by all workers on a host)
+SESSION_BACKEND = _env_str("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = _env_str("SESSION_DB_PATH", "sessions.db")
+SESSION_MAX_CONVERSATIONS = _env_int("SESSION_MAX_CONVERSATIONS", 10000)
+SESSION_CACHE_SIZE = _env_int("SESSION_CACHE_SIZE", 8)  # analyses/embeddings kept per conversation
+
+# Shared cache tier for Giphy responses, GIF embeddings and suggestion lists:
+# "none", "memory" (per process), "sqlite" (one host) or "redis" (cluster)
+SHARED_CACHE_BACKEND = _env_str("SHARED_CACHE_BACKEND", "memory")
+SHARED_CACHE_PATH = _env_str("SHARED_CACHE_PATH", "shared_cache.db")
+SHARED_CACHE_URL = _env_str("SHARED_CACHE_URL", "redis://localhost:6379/0")
+NEAR_CACHE_SIZE = _env_int("NEAR_CACHE_SIZE", 2048)  # hot entries kept per process in front of sqlite/redis
+NEAR_CACHE_TTL_S = _env_float("NEAR_CACHE_TTL_S", 60.0)
+GIPHY_CACHE_TTL_S = _env_int("GIPHY_CACHE_TTL_S", 300)
+EMBEDDING_CACHE_TTL_S = _env_int("EMBEDDING_CACHE_TTL_S", 7 * 24 * 3600)
+SUGGESTION_CACHE_TTL_S = _env_int("SUGGESTION_CACHE_TTL_S", 120)
+
+# HTTP caching and compression
+TRENDING_MAX_AGE_S = _env_int("TRENDING_MAX_AGE_S", 60)  # Cache-Control max-age for /trending_gifs
+SEARCH_MAX_AGE_S = _env_int("SEARCH_MAX_AGE_S", 300)  # Cache-Control max-age for GET /search_gifs
+COMPRESS_RESPONSES = _env_bool("COMPRESS_RESPONSES", True)
+COMPRESS_MIN_BYTES = _env_int("COMPRESS_MIN_BYTES", 500)
+COMPRESS_LEVEL = _env_int("COMPRESS_LEVEL", 6)
+
+# Generated reply text (DialoGPT); off by default because generation dominates request latency
+REPLY_MODEL_ENABLED = _env_bool("REPLY_MODEL_ENABLED", False)
+REPLY_MODEL = _env_str("REPLY_MODEL", "microsoft/DialoGPT-small")
+REPLY_MAX_NEW_TOKENS = _env_int("REPLY_MAX_NEW_TOKENS", 24)
+REPLY_CONTEXT_TURNS = _env_int("REPLY_CONTEXT_TURNS", 3)  # conversation turns in the prompt and cache key
+REPLY_CACHE_SIZE = _env_int("REPLY_CACHE_SIZE", 1024)
+REPLY_MAX_BATCH_SIZE = _env_int("REPLY_MAX_BATCH_SIZE", 8)
+REPLY_TIMEOUT_S = _env_float("REPLY_TIMEOUT_S", 30.0)
+
+# Key phrase extraction: phrases kept per message (0 keeps all; search terms use the first two)
+MAX_KEY_PHRASES = _env_int("MAX_KEY_PHRASES", 2)
+KEY_PHRASE_TOKENIZER = _env_str("KEY_PHRASE_TOKENIZER", "nltk")  # "nltk" or "hf" (emotion model's tokenizer)
+
+# Local GIF corpus written by ingest_gifs.py; when set, suggestions are retrieved from it before Giphy
+LOCAL_CORPUS_DIR = _env_str("LOCAL_CORPUS_DIR", None)
+HYBRID_ALPHA = _env_float("HYBRID_ALPHA", 0.7)  # weight of CLIP similarity vs. BM25 keyword score
+HYBRID_CANDIDATES = _env_int("HYBRID_CANDIDATES", 200)  # candidates taken from each of BM25 and FAISS
+
+# Tracing: a span tree per request, returned in the JSON body when the request sends "X-Trace: 1",
+# and written to TRACE_FILE (JSON lines) for traced and TRACE_SAMPLE_RATE-sampled requests
+TRACE_HEADER_ENABLED = _env_bool("TRACE_HEADER_ENABLED", True)
+TRACE_SAMPLE_RATE = _env_float("TRACE_SAMPLE_RATE", 0.0)
+TRACE_FILE = _env_str("TRACE_FILE", None)
+
+# Profiling: cProfile (and optionally torch.profiler) dumps for a sample of requests
+PROFILE_SAMPLE_RATE = _env_float("PROFILE_SAMPLE_RATE", 0.0)
+PROFILE_DIR = _env_str("PROFILE_DIR", "profiles")
+PROFILE_TORCH = _env_bool("PROFILE_TORCH", False)
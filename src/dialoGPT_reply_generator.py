@@ -1,32 +1,178 @@
 # src/dialoGPT_reply_generator.py
-from transformers import pipeline
+import threading
+from collections import OrderedDict
 
-# Using DialoGPT-large (you can also try DialoGPT-medium if resource-constrained)
-model_name = "microsoft/DialoGPT-large"
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, TextIteratorStreamer
 
-# Initialize the text-generation pipeline
-reply_pipeline = pipeline("text-generation", model=model_name, tokenizer=model_name)
+from inference_worker import InferenceWorker
+from metrics import record_cache_lookup, time_stage
 
-def generate_reply(user2_message, max_length=50):
+# DialoGPT-small keeps generation within the request latency budget on CPU;
+# DialoGPT-medium or -large give better replies if there is headroom
+DEFAULT_MODEL = "microsoft/DialoGPT-small"
+
+
+class DialoGPTReplyGenerator:
     """
-    Generates a conversational reply using DialoGPT-large.
-    The prompt is formatted as:
-        "User2: <user2_message>\nUser1 reply:"
-    and extracts the generated reply.
+    Conversational replies from DialoGPT.
+
+    The model is loaded on first use, not at import. Replies are bounded by
+    max_new_tokens (independent of the prompt length) and generated with the
+    key/value cache. With worker_options, concurrent requests are generated
+    together in one left-padded batch on an InferenceWorker. Replies are
+    cached by the recent conversation context they were generated for.
     """
-    prompt = f"User2: {user2_message}\nUser1 reply:"
-    result = reply_pipeline(prompt, max_length=max_length, num_return_sequences=1, do_sample=True, temperature=0.8, top_p=0.9)
-    generated_text = result[0]['generated_text']
-    
-    # Extract the part after the prompt if possible.
-    if "User1 reply:" in generated_text:
-        reply = generated_text.split("User1 reply:")[-1].strip()
-    else:
-        reply = generated_text.strip()
-    return reply
+
+    def __init__(self, model_name=DEFAULT_MODEL, max_new_tokens=24, context_turns=3, cache_size=1024,
+                 temperature=0.8, top_p=0.9, worker_options=None):
+        self.model_name = model_name
+        self.max_new_tokens = max_new_tokens
+        self.context_turns = context_turns
+        self.cache_size = cache_size
+        self.temperature = temperature
+        self.top_p = top_p
+        self.model = None
+        self.tokenizer = None
+        self._load_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.worker = None
+        if worker_options is not None:
+            self.worker = InferenceWorker("dialogpt", self._generate_batch, **worker_options)
+
+    def load(self):
+        """Loads the tokenizer and model if they aren't loaded yet."""
+        if self.model is not None:
+            return
+        with self._load_lock:
+            if self.model is not None:
+                return
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            # GPT-2 has no pad token; pad on the left so every prompt ends right before its reply
+            tokenizer.pad_token = tokenizer.eos_token
+            tokenizer.padding_side = "left"
+            # Over-long prompts lose their oldest tokens; the latest turn is what is being replied to
+            tokenizer.truncation_side = "left"
+            model = AutoModelForCausalLM.from_pretrained(self.model_name).eval()
+            self.tokenizer = tokenizer
+            self.model = model
+
+    def _context(self, turns):
+        """The last context_turns non-empty turns, which are both the prompt and the cache key."""
+        return tuple(turn.strip() for turn in turns if turn and turn.strip())[-self.context_turns:]
+
+    def _prompt(self, context):
+        # DialoGPT separates conversation turns with the end-of-text token
+        return "".join(turn + self.tokenizer.eos_token for turn in context)
+
+    def _tokenize(self, contexts):
+        """
+        Left-padded, left-truncated prompts. Prompt and reply must fit in the model's
+        n_positions together, so one long message can't fail generation for its whole batch.
+        """
+        max_length = self.model.config.n_positions - self.max_new_tokens
+        return self.tokenizer([self._prompt(context) for context in contexts], return_tensors="pt",
+                              padding=True, truncation=True, max_length=max_length)
+
+    def _generation_kwargs(self):
+        return {
+            "max_new_tokens": self.max_new_tokens,
+            "do_sample": True,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "use_cache": True,
+            "pad_token_id": self.tokenizer.eos_token_id,
+        }
+
+    def _generate_batch(self, contexts):
+        """Generates one reply per context in a single generate() call."""
+        self.load()
+        inputs = self._tokenize(contexts)
+        with torch.no_grad():
+            output = self.model.generate(**inputs, **self._generation_kwargs())
+        new_tokens = output[:, inputs["input_ids"].shape[1]:]
+        return [reply.strip() for reply in self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+    def _cached(self, context):
+        with self._cache_lock:
+            reply = self._cache.get(context)
+            if reply is not None:
+                self._cache.move_to_end(context)
+        record_cache_lookup("reply", reply is not None)
+        return reply
+
+    def _store(self, context, reply):
+        if not reply or self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[context] = reply
+            self._cache.move_to_end(context)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def generate(self, turns, timeout=None):
+        """
+        Generates a reply to the last of turns (oldest first); earlier turns are context.
+        Raises QueueFullError when the generation queue is full.
+        """
+        context = self._context(turns)
+        if not context:
+            return ""
+        reply = self._cached(context)
+        if reply is not None:
+            return reply
+        with time_stage("reply_generation"):
+            if self.worker is not None:
+                reply = self.worker.run(context, timeout=timeout)
+            else:
+                reply = self._generate_batch([context])[0]
+        self._store(context, reply)
+        return reply
+
+    def stream(self, turns, timeout=None):
+        """
+        Yields the reply to turns as text chunks while it is generated.
+        Streaming can't share a batch, so it runs outside the batching worker and callers
+        bound how many streams run at once; a cached reply is yielded whole. Raises
+        queue.Empty if no new text arrives within timeout seconds.
+        """
+        context = self._context(turns)
+        if not context:
+            return
+        reply = self._cached(context)
+        if reply is not None:
+            yield reply
+            return
+        self.load()
+        inputs = self._tokenize([context])
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+
+        def run():
+            with torch.no_grad():
+                self.model.generate(**inputs, **self._generation_kwargs(), streamer=streamer)
+
+        thread = threading.Thread(target=run, name="dialogpt-stream", daemon=True)
+        thread.start()
+        chunks = []
+        for chunk in streamer:
+            chunks.append(chunk)
+            yield chunk
+        thread.join()
+        self._store(context, "".join(chunks).strip())
+
+
+_default_generator = None
+
+
+def generate_reply(user2_message, max_new_tokens=24):
+    """Generates a conversational reply to a single message with a shared, lazily loaded generator."""
+    global _default_generator
+    if _default_generator is None:
+        _default_generator = DialoGPTReplyGenerator(max_new_tokens=max_new_tokens)
+    return _default_generator.generate([user2_message])
 
 if __name__ == "__main__":
     sample_message = "I feel so miserable."
     reply = generate_reply(sample_message)
-    print("DialoGPT-large generated reply:", reply)
-
+    print("DialoGPT generated reply:", reply)
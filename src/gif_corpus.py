@@ -0,0 +1,148 @@
+# src/gif_corpus.py
+"""
+On-disk layout of a local GIF corpus built by ingest_gifs.py.
+
+    corpus/
+      manifest.json          completed shards, embedding size, counts
+      shard-00000.npy        float16 embeddings, shape (n, embed_dim), rows normalized
+      shard-00000.jsonl      one metadata record per row: id, url, title, tags
+      failed.jsonl           inputs that could not be downloaded or decoded
+
+A shard only counts once it is listed in the manifest, and the manifest is
+replaced atomically after the shard files are on disk, so a crash loses at
+most the GIFs added since the last checkpoint.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+MANIFEST = "manifest.json"
+FAILED = "failed.jsonl"
+
+
+def _shard_name(number):
+    return f"shard-{number:05d}"
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {"embed_dim": None, "shards": [], "count": 0, "failed": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_failed_ids(directory):
+    path = os.path.join(directory, FAILED)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {json.loads(line)["id"] for line in f if line.strip()}
+
+
+def iter_shards(directory):
+    """Yields (embeddings, metadata) for every completed shard, in order."""
+    for shard in read_manifest(directory)["shards"]:
+        base = os.path.join(directory, shard["name"])
+        # mmap so large corpora are paged in on demand rather than copied
+        embeddings = np.load(f"{base}.npy", mmap_mode="r")
+        with open(f"{base}.jsonl") as f:
+            metadata = [json.loads(line) for line in f if line.strip()]
+        yield embeddings, metadata
+
+
+def read_done_ids(directory):
+    """IDs of every GIF already stored in a completed shard."""
+    done = set()
+    for _, metadata in iter_shards(directory):
+        done.update(record["id"] for record in metadata)
+    return done
+
+
+def load_corpus(directory):
+    """
+    Loads a whole corpus.
+    Returns (embeddings, metadata): a float32 array of shape (n, embed_dim) and a list of n dicts.
+    """
+    all_embeddings, all_metadata = [], []
+    for embeddings, metadata in iter_shards(directory):
+        all_embeddings.append(np.asarray(embeddings, dtype=np.float32))
+        all_metadata.extend(metadata)
+    embed_dim = read_manifest(directory)["embed_dim"] or 0
+    if not all_embeddings:
+        return np.zeros((0, embed_dim), dtype=np.float32), []
+    return np.concatenate(all_embeddings), all_metadata
+
+
+class CorpusWriter:
+    """
+    Buffers embeddings and metadata and writes them out in shards of at most shard_size.
+    Each flush is a checkpoint: the shard files are written first, then the manifest.
+    A shard is flushed when it is full, or early once checkpoint_every seconds have
+    passed since the last checkpoint, so a slow ingest never has hours of work unsaved.
+    """
+
+    def __init__(self, directory, shard_size=10000, checkpoint_every=None):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.checkpoint_every = checkpoint_every
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = read_manifest(directory)
+        self._embeddings = []
+        self._metadata = []
+        self._failed = []
+        self._last_checkpoint = time.monotonic()
+
+    def add(self, embedding, meta):
+        """Adds one normalized embedding of shape (embed_dim,) or (1, embed_dim)."""
+        self._embeddings.append(np.asarray(embedding, dtype=np.float16).reshape(-1))
+        self._metadata.append(meta)
+        if len(self._embeddings) >= self.shard_size or self._checkpoint_due():
+            self.flush()
+
+    def add_failure(self, gif_id, error):
+        self._failed.append({"id": gif_id, "error": str(error)})
+        if self._checkpoint_due():
+            self.flush()
+
+    def _checkpoint_due(self):
+        return self.checkpoint_every is not None and time.monotonic() - self._last_checkpoint >= self.checkpoint_every
+
+    def flush(self):
+        if self._failed:
+            # Appended before the manifest update; a crash in between only skips GIFs that failed anyway
+            with open(os.path.join(self.directory, FAILED), "a") as f:
+                for record in self._failed:
+                    f.write(json.dumps(record) + "\n")
+            self.manifest["failed"] += len(self._failed)
+            self._failed = []
+        if self._embeddings:
+            embeddings = np.stack(self._embeddings)
+            name = _shard_name(len(self.manifest["shards"]))
+            base = os.path.join(self.directory, name)
+            _write_atomic(f"{base}.npy", lambda f: np.save(f, embeddings))
+            metadata = "".join(json.dumps(meta) + "\n" for meta in self._metadata).encode()
+            _write_atomic(f"{base}.jsonl", lambda f: f.write(metadata))
+            self.manifest["embed_dim"] = int(embeddings.shape[1])
+            self.manifest["shards"].append({"name": name, "count": len(self._metadata)})
+            self.manifest["count"] += len(self._metadata)
+            self._embeddings = []
+            self._metadata = []
+        manifest = json.dumps(self.manifest, indent=2).encode()
+        _write_atomic(os.path.join(self.directory, MANIFEST), lambda f: f.write(manifest))
+        self._last_checkpoint = time.monotonic()
+
+    @property
+    def count(self):
+        return self.manifest["count"] + len(self._metadata)
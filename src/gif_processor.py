@@ -3,14 +3,32 @@ import torch
 from PIL import Image, ImageSequence
 import requests
 from io import BytesIO
-import open_clip
+
+from clip_optimize import ImageEncoder, build_encoder
+from model_store import load_clip
+from metrics import time_stage
 
 class GifProcessor:
-    def __init__(self, model_name="ViT-B/32"):
+    def __init__(self, model_name="ViT-B/32", backend="eager", artifact_dir=None, num_threads=0, clip=None):
+        """
+        backend selects the image encoder implementation (see clip_optimize.BACKENDS);
+        optimized backends are CPU-only and cache their artifacts in artifact_dir.
+        clip: a (model, preprocess) pair from model_store.load_clip, so the text and image
+        processors can share one CLIP model; loaded here when not given. The int8 backends
+        quantize their tower of this model in place.
+        """
         self.device = "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu"
         print(f"Device set to use {self.device}")
-        self.model, _, self.preprocess = open_clip.create_model_and_transforms('ViT-B-32', pretrained='openai')
+        if clip is None:
+            clip = load_clip()
+        self.model, self.preprocess = clip
         self.model = self.model.to(self.device)
+        self.backend = backend
+        self.encode_image = build_encoder(
+            ImageEncoder(self.model), "ViT-B-32-image", backend,
+            example_input=torch.randn(2, 3, 224, 224, device=self.device),
+            artifact_dir=artifact_dir, num_threads=num_threads, device=self.device
+        )
 
     def open_image(self, path_or_url):
         """
@@ -18,8 +36,9 @@ class GifProcessor:
         Returns a PIL Image object.
         """
         if path_or_url.startswith("http"):
-            response = requests.get(path_or_url)
-            response.raise_for_status()
+            with time_stage("gif_download", url=path_or_url):
+                response = requests.get(path_or_url)
+                response.raise_for_status()
             return Image.open(BytesIO(response.content))
         else:
             return Image.open(path_or_url)
@@ -31,35 +50,54 @@ class GifProcessor:
         """
         frames = []
         im = self.open_image(gif_path)
-        for i, frame in enumerate(ImageSequence.Iterator(im)):
-            if i >= max_frames:
-                break
-            # Convert each frame to RGB (ensuring consistency)
-            frames.append(frame.convert("RGB"))
+        # PIL decodes lazily, so the frame data is only decoded here
+        with time_stage("frame_decode"):
+            for i, frame in enumerate(ImageSequence.Iterator(im)):
+                if i >= max_frames:
+                    break
+                # Convert each frame to RGB (ensuring consistency)
+                frames.append(frame.convert("RGB"))
         return frames
 
-    def get_gif_embedding(self, gif_path, max_frames=5):
+    def preprocess_frames(self, frames):
         """
-        Processes a GIF: extracts frames, computes embeddings for each frame,
-        and returns an averaged, normalized embedding for the GIF.
+        Applies the CLIP preprocessing to each frame.
+        Returns a list of image tensors of shape (3, H, W).
+        """
+        return [self.preprocess(frame) for frame in frames]
+
+    def encode_images(self, images):
+        """
+        Encodes a batch of preprocessed image tensors in a single forward pass.
+        Returns a tensor of shape (len(images), embed_dim) with normalized rows.
         """
-        frames = self.extract_frames(gif_path, max_frames)
-        embeddings = []
         with torch.no_grad():
-            for frame in frames:
-                # Preprocess the frame and add a batch dimension
-                input_image = self.preprocess(frame).unsqueeze(0).to(self.device)
-                # Get image features using CLIP's image encoder
-                img_features = self.model.encode_image(input_image)
-                # Normalize the embedding
-                img_features = img_features / img_features.norm(dim=-1, keepdim=True)
-                embeddings.append(img_features)
-            # Concatenate embeddings and compute the average embedding
-            avg_embedding = torch.mean(torch.cat(embeddings, dim=0), dim=0, keepdim=True)
-            # Normalize the final embedding
+            batch = torch.stack(list(images)).to(self.device)
+            # Get image features using CLIP's image encoder
+            img_features = self.encode_image(batch)
+            # Normalize the embeddings
+            img_features = img_features / img_features.norm(dim=-1, keepdim=True)
+        return img_features
+
+    def average_embeddings(self, frame_embeddings):
+        """
+        Averages normalized per-frame embeddings of shape (n_frames, embed_dim)
+        into a single normalized GIF embedding of shape (1, embed_dim).
+        """
+        with torch.no_grad():
+            avg_embedding = torch.mean(frame_embeddings, dim=0, keepdim=True)
             avg_embedding = avg_embedding / avg_embedding.norm(dim=-1, keepdim=True)
         return avg_embedding
 
+    def get_gif_embedding(self, gif_path, max_frames=5):
+        """
+        Processes a GIF: extracts frames, computes embeddings for all frames
+        in one batch, and returns an averaged, normalized embedding for the GIF.
+        """
+        frames = self.extract_frames(gif_path, max_frames)
+        frame_embeddings = self.encode_images(self.preprocess_frames(frames))
+        return self.average_embeddings(frame_embeddings)
+
 # Example usage:
 if __name__ == "__main__":
     # Replace with a valid GIF URL from Giphy
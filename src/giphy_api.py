@@ -2,14 +2,23 @@
 import requests
 import time
 
+from metrics import record_cache_lookup, time_stage
+
+DEFAULT_BASE_URL = "https://api.giphy.com/v1/gifs"
+
 class GiphyAPI:
-    def __init__(self, api_key):
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, shared_cache=None, cache_duration=300):
+        """
+        shared_cache: optional SharedCache; when set, responses are cached there
+        (and so shared with other workers) instead of in this instance.
+        """
         self.api_key = api_key
-        self.base_url = "https://api.giphy.com/v1/gifs"
+        self.base_url = base_url.rstrip("/")
         self.last_request_time = 0
         self.min_request_interval = 0.1  # 100ms between requests
+        self.shared_cache = shared_cache
         self._cache = {}  # Simple cache for responses
-        self._cache_duration = 300  # Cache duration in seconds (5 minutes)
+        self._cache_duration = cache_duration  # Cache duration in seconds (5 minutes by default)
 
     def _rate_limit(self):
         """Implement simple rate limiting"""
@@ -21,16 +30,23 @@ class GiphyAPI:
 
     def _get_cached_response(self, cache_key):
         """Get a cached response if it exists and is not expired"""
+        if self.shared_cache is not None:
+            return self.shared_cache.get_json("giphy", cache_key)
         if cache_key in self._cache:
             timestamp, data = self._cache[cache_key]
             if time.time() - timestamp < self._cache_duration:
+                record_cache_lookup("giphy", True)
                 return data
             else:
                 del self._cache[cache_key]
+        record_cache_lookup("giphy", False)
         return None
 
     def _cache_response(self, cache_key, data):
         """Cache a response with the current timestamp"""
+        if self.shared_cache is not None:
+            self.shared_cache.set_json("giphy", cache_key, data, ttl=self._cache_duration)
+            return
         self._cache[cache_key] = (time.time(), data)
 
     def _extract_gif_urls(self, data, size='fixed_height'):
@@ -60,7 +76,8 @@ class GiphyAPI:
                 'lang': 'en'
             }
             
-            response = requests.get(f"{self.base_url}/search", params=params)
+            with time_stage("giphy_search", query=query):
+                response = requests.get(f"{self.base_url}/search", params=params)
             
             # Handle rate limiting response
             if response.status_code == 429:
@@ -99,7 +116,8 @@ class GiphyAPI:
                 'rating': 'pg'
             }
             
-            response = requests.get(f"{self.base_url}/trending", params=params)
+            with time_stage("giphy_trending"):
+                response = requests.get(f"{self.base_url}/trending", params=params)
             
             # Handle rate limiting response
             if response.status_code == 429:
@@ -0,0 +1,83 @@
+# src/http_cache.py
+"""
+HTTP-level caching and compact JSON responses.
+
+json_response() serializes with orjson when it is installed (compact stdlib
+json otherwise). Cacheable responses get a weak ETag and Cache-Control, and
+a matching If-None-Match is answered with an empty 304. compress_response()
+is an after_request hook that gzip- or brotli-encodes text responses.
+"""
+import gzip
+import hashlib
+import json
+
+import numpy as np
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html"}
+
+
+def _default(value):
+    # Similarity scores and embeddings can still be numpy values
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """Serializes data to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_response(data, status=200, max_age=None):
+    """
+    Builds a JSON response.
+    With max_age, a successful response is publicly cacheable for max_age seconds and
+    carries an ETag; a request whose If-None-Match matches gets a 304 without a body.
+    With max_age=0 the response is marked no-store.
+    """
+    response = Response(dumps(data), status=status, mimetype="application/json")
+    if max_age is None:
+        return response
+    if status != 200 or max_age <= 0:
+        response.cache_control.no_store = True
+        return response
+    # Weak, because the same payload is served under different Content-Encodings
+    response.set_etag(hashlib.blake2b(response.get_data(), digest_size=16).hexdigest(), weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+def compress_response(response, min_size=500, level=6):
+    """Compresses text responses of at least min_size bytes with brotli or gzip, as the client accepts."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        # Brotli quality runs 0-11; the mid levels compress about as fast as gzip -6
+        response.set_data(brotli.compress(data, quality=min(level, 11)))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(data, compresslevel=level))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
@@ -0,0 +1,150 @@
+# src/hybrid_retriever.py
+import re
+from collections import Counter
+
+import numpy as np
+
+from vector_index import VectorIndex
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercased alphanumeric words; used for both GIF titles/tags and search terms."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _minmax(scores):
+    if scores.size == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    if high - low < 1e-9:
+        return np.ones_like(scores) if high > 0 else np.zeros_like(scores)
+    return (scores - low) / (high - low)
+
+
+class BM25Index:
+    """
+    In-memory inverted index with BM25 scoring.
+
+    Each posting list stores its document IDs together with the precomputed
+    BM25 weight of the term in that document, so a query only concatenates
+    the posting lists of its terms and sums weights per document.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        """documents: a list of token lists, one per document, indexed by position."""
+        self.num_documents = len(documents)
+        lengths = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+        average_length = float(lengths.mean()) if self.num_documents else 0.0
+        raw = {}
+        for doc_id, tokens in enumerate(documents):
+            for term, count in Counter(tokens).items():
+                raw.setdefault(term, ([], []))
+                raw[term][0].append(doc_id)
+                raw[term][1].append(count)
+        self.postings = {}
+        for term, (doc_ids, counts) in raw.items():
+            doc_ids = np.array(doc_ids, dtype=np.int64)
+            counts = np.array(counts, dtype=np.float32)
+            idf = np.log(1.0 + (self.num_documents - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = k1 * (1.0 - b + b * lengths[doc_ids] / max(average_length, 1e-9))
+            self.postings[term] = (doc_ids, (idf * counts * (k1 + 1.0) / (counts + norm)).astype(np.float32))
+
+    def search(self, terms, top_k=200):
+        """
+        Scores documents for a bag of query terms.
+        Returns (doc_ids, scores), best first, for at most top_k matching documents.
+        """
+        lists = [self.postings[term] for term in set(terms) if term in self.postings]
+        if not lists:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        doc_ids = np.concatenate([ids for ids, _ in lists])
+        weights = np.concatenate([w for _, w in lists])
+        matched, inverse = np.unique(doc_ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        if len(matched) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            matched, scores = matched[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return matched[order], scores[order]
+
+
+class HybridRetriever:
+    """
+    Candidate retrieval over a local GIF corpus, without calling Giphy.
+
+    Keyword search terms go through a BM25 index over GIF titles and tags; the
+    message's CLIP text embedding goes through the FAISS index. The union of
+    both candidate sets is re-ranked in one vectorized pass: cosine similarity
+    from the reconstructed GIF embeddings and the BM25 score, each min-max
+    normalized over the candidates and mixed with weight alpha.
+    """
+
+    def __init__(self, vector_index: VectorIndex, alpha=0.7, candidates=200):
+        self.index = vector_index
+        self.alpha = alpha
+        self.candidates = candidates
+        documents = [
+            tokenize(" ".join([meta.get("title", "")] + list(meta.get("tags", []))))
+            for meta in vector_index.metadata
+        ]
+        self.bm25 = BM25Index(documents)
+
+    @classmethod
+    def from_corpus(cls, directory, **kwargs):
+        """Builds a retriever over a corpus written by ingest_gifs.py."""
+        return cls(VectorIndex.from_corpus(directory), **kwargs)
+
+    def __len__(self):
+        return self.index.index.ntotal
+
+    def search(self, search_terms, text_embedding=None, top_k=6):
+        """
+        Returns up to top_k (metadata, score, similarity) tuples, best first.
+        similarity is the CLIP cosine similarity, or None without a text embedding.
+        """
+        lexical_ids, lexical_scores = self.bm25.search(
+            [token for term in search_terms for token in tokenize(term)], self.candidates
+        )
+        candidates = np.unique(lexical_ids)
+        query = None
+        if text_embedding is not None and len(self):
+            query = np.ascontiguousarray(text_embedding, dtype=np.float32).reshape(1, -1)
+            vector_ids, _ = self.index.search(query, top_k=self.candidates)
+            candidates = np.union1d(candidates, vector_ids[vector_ids >= 0])
+        if candidates.size == 0:
+            return []
+
+        # Candidates are sorted, so each lexical hit's row is found by binary search
+        lexical = np.zeros(candidates.size, dtype=np.float32)
+        lexical[np.searchsorted(candidates, lexical_ids)] = lexical_scores
+        similarity = None
+        score = _minmax(lexical)
+        if query is not None:
+            similarity = self.index.reconstruct(candidates) @ query[0]
+            score = self.alpha * _minmax(similarity) + (1.0 - self.alpha) * score
+
+        count = min(top_k, candidates.size)
+        best = np.argpartition(-score, count - 1)[:count]
+        best = best[np.argsort(-score[best], kind="stable")]
+        return [
+            (self.index.metadata[candidates[i]], float(score[i]),
+             float(similarity[i]) if similarity is not None else None)
+            for i in best
+        ]
+
+
+# Example usage:
+if __name__ == "__main__":
+    embed_dim = 512
+    rng = np.random.default_rng(0)
+    titles = ["happy dog dancing", "sad cat in the rain", "excited crowd cheering", "dog running on beach"]
+    embeddings = rng.standard_normal((len(titles), embed_dim)).astype("float32")
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    index = VectorIndex(embed_dim)
+    index.add_embeddings(embeddings, [{"id": str(i), "url": f"gif{i}.gif", "title": t, "tags": []}
+                                      for i, t in enumerate(titles)])
+    retriever = HybridRetriever(index)
+    for meta, score, similarity in retriever.search(["happy", "dog"], embeddings[:1]):
+        print(meta["title"], round(score, 3), round(similarity, 3))
@@ -0,0 +1,182 @@
+# src/inference_worker.py
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+import tracing
+from metrics import (
+    INFERENCE_BATCH_SECONDS,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_QUEUE_DEPTH,
+    INFERENCE_REJECTED,
+    INFERENCE_WAIT_SECONDS,
+)
+
+_STOP = object()
+
+
+class QueueFullError(Exception):
+    """Raised when an inference queue is full and new work is rejected."""
+
+    def __init__(self, worker_name, retry_after=1):
+        super().__init__(f"Inference queue '{worker_name}' is full")
+        self.worker_name = worker_name
+        self.retry_after = retry_after
+
+
+class InferenceWorker:
+    """
+    Runs a model on a single dedicated thread, fed by a bounded queue.
+
+    Items submitted by different callers are dynamically batched: the worker
+    takes the first queued item, then keeps collecting until it has
+    max_batch_size items or max_wait_ms has elapsed, and calls batch_fn once
+    for the whole batch. batch_fn receives a list of items and must return a
+    sequence with one result per item, in order.
+    """
+
+    def __init__(self, name, batch_fn, max_batch_size=32, max_wait_ms=5.0,
+                 max_queue_size=256, timeout=30.0, retry_after=1):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.queue_capacity = max_queue_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        # Histograms live in the shared metrics registry, labelled with the worker name
+        self.wait_time = INFERENCE_WAIT_SECONDS.labels(name)
+        self.batch_time = INFERENCE_BATCH_SECONDS.labels(name)
+        self.batch_size = INFERENCE_BATCH_SIZE.labels(name)
+        self._rejected = INFERENCE_REJECTED.labels(name)
+        INFERENCE_QUEUE_DEPTH.labels(name).set_function(self.queue_depth)
+        self._thread = threading.Thread(target=self._run_loop, name=f"inference-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """
+        Queue a single item and return a Future for its result.
+        Raises QueueFullError immediately if the queue is full.
+        """
+        future = Future()
+        try:
+            # A profiled request's items carry its profile handle, so their batch is profiled too
+            self._queue.put_nowait((item, future, time.monotonic(), tracing.current_profile()))
+        except queue.Full:
+            self._rejected.inc()
+            raise QueueFullError(self.name, self.retry_after)
+        return future
+
+    def submit_many(self, items):
+        """
+        Queue several items and return their Futures. If the queue fills up
+        part way, the already-queued items are cancelled and QueueFullError is raised.
+        """
+        futures = []
+        try:
+            for item in items:
+                futures.append(self.submit(item))
+        except QueueFullError:
+            for future in futures:
+                future.cancel()
+            raise
+        return futures
+
+    def run(self, item, timeout=None):
+        """Run a single item through the model and wait for its result."""
+        return self._wait([self.submit(item)], timeout)[0]
+
+    def run_many(self, items, timeout=None):
+        """Run several items through the model and wait for all results."""
+        return self._wait(self.submit_many(items), timeout)
+
+    def _wait(self, futures, timeout=None):
+        """
+        Waits for futures with one shared deadline. On timeout the items that
+        haven't started are cancelled, so the worker drops them instead of
+        spending model time on results nobody is waiting for.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        try:
+            return [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+        except TimeoutError:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """Returns queue depth, rejection count and the wait/batch histograms."""
+        return {
+            "queue_depth": self.queue_depth(),
+            "queue_capacity": self.queue_capacity,
+            "rejected": int(self._rejected.value),
+            "wait_seconds": self.wait_time.snapshot(),
+            "batch_seconds": self.batch_time.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+        }
+
+    def shutdown(self, wait=True):
+        """Stop the worker thread once the queued work has drained."""
+        self._queue.put(_STOP)
+        if wait:
+            self._thread.join()
+
+    def _next_batch(self):
+        """Block for the first item, then gather more until the batch is full or the wait expires."""
+        first = self._queue.get()
+        if first is _STOP:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Drain whatever is already queued without waiting, then wait out the rest
+                entry = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            # A cancelled item (its caller timed out) shouldn't take a slot in the batch
+            if not entry[1].cancelled():
+                batch.append(entry)
+        return batch, False
+
+    def _run_loop(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch):
+        now = time.monotonic()
+        # Skip items whose caller gave up (timed out, or cancelled after a partial submit_many)
+        live = [(item, future, profile) for item, future, enqueued, profile in batch
+                if future.set_running_or_notify_cancel()]
+        for _, _, enqueued, _ in batch:
+            self.wait_time.observe(now - enqueued)
+        if not live:
+            return
+        self.batch_size.observe(len(live))
+        profiles = list({id(profile): profile for _, _, profile in live if profile is not None}.values())
+        try:
+            with tracing.profile_batch(self.name, profiles):
+                results = self.batch_fn([item for item, _, _ in live])
+            if len(results) != len(live):
+                raise RuntimeError(
+                    f"{self.name} returned {len(results)} results for a batch of {len(live)}"
+                )
+        except Exception as e:
+            for _, future, _ in live:
+                future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(live, results):
+                future.set_result(result)
+        finally:
+            self.batch_time.observe(time.monotonic() - now)
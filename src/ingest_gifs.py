@@ -0,0 +1,280 @@
+# src/ingest_gifs.py
+"""
+Bulk GIF ingestion: embeds a large set of GIFs with CLIP into a sharded local corpus.
+
+Inputs are directories of .gif files and/or list files. A list file holds
+one GIF per line as "url<TAB>title<TAB>tag1,tag2" (title and tags optional),
+or, for .jsonl files, one {"url", "title", "tags"} object per line.
+
+The pipeline overlaps the three costs of embedding a GIF:
+
+  * downloads run on a bounded thread pool (--download-workers)
+  * frame decoding and CLIP preprocessing run in a process pool (--decode-workers)
+  * frames from many GIFs are encoded together in CLIP batches (--batch-size)
+
+Results are written as float16 shards (see gif_corpus.py). Every finished
+shard is a checkpoint; rerunning the same command skips GIFs that are
+already stored or that failed before (unless --retry-failed).
+
+    python src/ingest_gifs.py --input gif_urls.tsv --output corpus/
+    python src/ingest_gifs.py --input ~/gifs --output corpus/ --decode-workers 8 --backend int8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from io import BytesIO
+
+import numpy as np
+import requests
+import torch
+from PIL import Image, ImageSequence
+
+from clip_optimize import BACKENDS
+from gif_corpus import CorpusWriter, read_done_ids, read_failed_ids
+from gif_processor import GifProcessor
+from model_store import clip_preprocess_config, clip_transform, load_clip
+
+# Set in each decode process by _init_decoder
+_preprocess = None
+_max_frames = 5
+
+
+def _init_decoder(preprocess_config, max_frames):
+    global _preprocess, _max_frames
+    _preprocess = clip_transform(preprocess_config)
+    _max_frames = max_frames
+    # Parallelism comes from the process pool; extra intra-op threads would only contend
+    torch.set_num_threads(1)
+
+
+def decode_gif(data):
+    """
+    Decodes up to max_frames frames and applies the CLIP preprocessing.
+    Runs in a decode process. Returns a float32 array of shape (n_frames, 3, H, W).
+    """
+    im = Image.open(BytesIO(data))
+    frames = []
+    for i, frame in enumerate(ImageSequence.Iterator(im)):
+        if i >= _max_frames:
+            break
+        frames.append(_preprocess(frame.convert("RGB")))
+    if not frames:
+        raise ValueError("GIF has no frames")
+    return torch.stack(frames).numpy()
+
+
+def _title_from_path(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.replace("_", " ").replace("-", " ")
+
+
+def read_entries(source):
+    """Yields {"id", "url", "title", "tags"} dicts from a directory or a list file."""
+    if os.path.isdir(source):
+        for root, _, names in sorted(os.walk(source)):
+            for name in sorted(names):
+                if name.lower().endswith(".gif"):
+                    path = os.path.abspath(os.path.join(root, name))
+                    yield {"id": path, "url": path, "title": _title_from_path(path), "tags": []}
+        return
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if source.endswith(".jsonl"):
+                record = json.loads(line)
+                url, title, tags = record["url"], record.get("title", ""), record.get("tags", [])
+            else:
+                fields = line.split("\t")
+                url = fields[0]
+                title = fields[1] if len(fields) > 1 else ""
+                tags = [tag.strip() for tag in fields[2].split(",") if tag.strip()] if len(fields) > 2 else []
+            yield {"id": url, "url": url, "title": title, "tags": tags}
+
+
+class Fetcher:
+    """Downloads (or reads) a GIF on a download thread and hands it to the decode pool."""
+
+    def __init__(self, decoders, timeout=10.0, retries=2):
+        self.decoders = decoders
+        self.timeout = timeout
+        self.retries = retries
+        self._local = threading.local()
+
+    def _session(self):
+        # requests.Session is not thread-safe, so each download thread keeps its own
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def download(self, url):
+        if not url.startswith("http"):
+            with open(url, "rb") as f:
+                return f.read()
+        for attempt in range(self.retries + 1):
+            try:
+                response = self._session().get(url, timeout=self.timeout)
+                response.raise_for_status()
+                return response.content
+            except requests.RequestException:
+                if attempt == self.retries:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def fetch_and_decode(self, entry):
+        data = self.download(entry["url"])
+        # Blocking here bounds the number of GIFs held in memory to the download pool size
+        return self.decoders.submit(decode_gif, data).result()
+
+
+class Progress:
+    def __init__(self, report_every=10.0):
+        self.report_every = report_every
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.embedded = 0
+        self.failed = 0
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.embedded / elapsed if elapsed else 0.0
+
+    def maybe_report(self, force=False):
+        now = time.perf_counter()
+        if force or now - self.last_report >= self.report_every:
+            self.last_report = now
+            print(f"{self.embedded} GIFs embedded, {self.failed} failed, "
+                  f"{self.rate:.1f} GIFs/s, {now - self.start:.0f}s elapsed", flush=True)
+
+
+def encode_batch(processor, batch, writer, progress):
+    """Encodes the frames of several GIFs in one forward pass and stores one averaged embedding per GIF."""
+    frames = torch.from_numpy(np.concatenate([item_frames for _, item_frames in batch]))
+    frame_embeddings = processor.encode_images(frames)
+    start = 0
+    for entry, item_frames in batch:
+        end = start + len(item_frames)
+        embedding = processor.average_embeddings(frame_embeddings[start:end])
+        writer.add(embedding.cpu().numpy(), {
+            "id": entry["id"], "url": entry["url"], "title": entry["title"], "tags": entry["tags"]
+        })
+        start = end
+    progress.embedded += len(batch)
+
+
+def ingest(entries, processor, writer, args):
+    progress = Progress(args.report_every)
+    # Decode processes are started lazily, from a download thread, while CLIP and the torch
+    # thread pools are loaded; forking then could copy a lock held by another thread and
+    # deadlock. Spawned processes start clean and rebuild the transform from plain settings.
+    decoders = ProcessPoolExecutor(
+        args.decode_workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_decoder, initargs=(clip_preprocess_config(processor.model), args.max_frames)
+    )
+    downloads = ThreadPoolExecutor(args.download_workers, thread_name_prefix="ingest-download")
+    fetcher = Fetcher(decoders, timeout=args.timeout, retries=args.retries)
+    entries = iter(entries)
+    pending = {}  # future -> entry
+    window = args.download_workers * 2
+    batch, batch_frames = [], 0
+    try:
+        while True:
+            while len(pending) < window:
+                entry = next(entries, None)
+                if entry is None:
+                    break
+                pending[downloads.submit(fetcher.fetch_and_decode, entry)] = entry
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry = pending.pop(future)
+                try:
+                    frames = future.result()
+                except Exception as e:
+                    writer.add_failure(entry["id"], e)
+                    progress.failed += 1
+                    continue
+                batch.append((entry, frames))
+                batch_frames += len(frames)
+                # Downloads and decodes keep running in the pools while the batch is encoded
+                if batch_frames >= args.batch_size:
+                    encode_batch(processor, batch, writer, progress)
+                    batch, batch_frames = [], 0
+            progress.maybe_report()
+        if batch:
+            encode_batch(processor, batch, writer, progress)
+    finally:
+        downloads.shutdown(wait=True, cancel_futures=True)
+        decoders.shutdown(wait=True, cancel_futures=True)
+        # Checkpoint whatever was finished, including on Ctrl-C
+        writer.flush()
+    progress.maybe_report(force=True)
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, action="append",
+                        help="Directory of GIFs or list file; may be given several times")
+    parser.add_argument("--output", required=True, help="Corpus directory (created or resumed)")
+    parser.add_argument("--download-workers", type=int, default=32, help="Concurrent downloads")
+    parser.add_argument("--decode-workers", type=int, default=os.cpu_count() or 1, help="Decode processes")
+    parser.add_argument("--batch-size", type=int, default=64, help="Frames per CLIP forward pass")
+    parser.add_argument("--max-frames", type=int, default=5, help="Frames sampled per GIF")
+    parser.add_argument("--shard-size", type=int, default=10000, help="Most GIFs per shard")
+    parser.add_argument("--checkpoint-every", type=float, default=60.0,
+                        help="Seconds between checkpoints; a checkpoint writes the shard being filled early")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-download timeout in seconds")
+    parser.add_argument("--retries", type=int, default=2, help="Download retries per GIF")
+    parser.add_argument("--limit", type=int, help="Stop after this many new GIFs")
+    parser.add_argument("--retry-failed", action="store_true", help="Try GIFs that failed in earlier runs again")
+    parser.add_argument("--backend", default="eager", choices=BACKENDS, help="CLIP image encoder backend")
+    parser.add_argument("--artifact-dir", help="Where compiled encoder artifacts are cached")
+    parser.add_argument("--model-dir", help="Prepared model directory (see model_store.py)")
+    parser.add_argument("--num-threads", type=int, default=0, help="Torch threads for encoding (0 = default)")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+
+    skip = read_done_ids(args.output)
+    if not args.retry_failed:
+        skip |= read_failed_ids(args.output)
+    if skip:
+        print(f"Resuming: skipping {len(skip)} GIFs already processed in {args.output}")
+
+    def new_entries():
+        seen = set(skip)
+        produced = 0
+        for source in args.input:
+            for entry in read_entries(source):
+                if entry["id"] in seen:
+                    continue
+                seen.add(entry["id"])
+                yield entry
+                produced += 1
+                if args.limit and produced >= args.limit:
+                    return
+
+    processor = GifProcessor(backend=args.backend, artifact_dir=args.artifact_dir, num_threads=args.num_threads,
+                             clip=load_clip(args.model_dir))
+    writer = CorpusWriter(args.output, shard_size=args.shard_size, checkpoint_every=args.checkpoint_every)
+    progress = ingest(new_entries(), processor, writer, args)
+    print(f"Done: {progress.embedded} GIFs embedded ({progress.rate:.1f} GIFs/s), {progress.failed} failed; "
+          f"corpus now holds {writer.count} GIFs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# src/key_phrases.py
+from typing import Dict, List, Optional, Tuple
+
+from nltk.tag import pos_tag
+from nltk.tag.perceptron import PerceptronTagger
+from nltk.tokenize import word_tokenize
+
+
+def legacy_key_phrases(message: str) -> List[str]:
+    """
+    The original extraction: tokenize and tag the whole message, then collect
+    nouns, verbs and adjective-noun pairs. Kept as the reference for benchmarks.
+    """
+    pos_tags = pos_tag(word_tokenize(message))
+    key_phrases = []
+    for i, (word, tag) in enumerate(pos_tags):
+        if tag.startswith('NN'):
+            key_phrases.append(word)
+        elif tag.startswith('VB'):
+            key_phrases.append(word)
+        elif tag.startswith('JJ') and i + 1 < len(pos_tags):
+            next_word, next_tag = pos_tags[i + 1]
+            if next_tag.startswith('NN'):
+                key_phrases.append(f"{word} {next_word}")
+    return key_phrases
+
+
+class KeyPhraseExtractor:
+    """
+    Extracts the same key phrases as legacy_key_phrases (nouns, verbs and
+    adjective-noun pairs, in message order), but faster:
+
+    * the perceptron tagger is loaded once; nltk.pos_tag builds a new one per call
+    * tags are produced one token at a time, and tagging stops as soon as
+      max_phrases phrases are found (callers only use the first few)
+    * extract_batch() shares tagger predictions between the messages of a batch:
+      a tag only depends on the word, the two words either side and the two
+      previous tags, so overlapping messages (such as successive prefixes of a
+      message being typed) predict each shared token once
+
+    With hf_tokenizer (a Hugging Face fast tokenizer, e.g. the emotion model's),
+    words are split by its Rust pre-tokenizer instead of NLTK's sentence and
+    word tokenizers. This is faster but splits contractions differently, so
+    results can differ slightly from the NLTK path.
+    """
+
+    def __init__(self, max_phrases: Optional[int] = 2, hf_tokenizer=None):
+        self.max_phrases = max_phrases
+        self.tagger = PerceptronTagger()
+        self.pre_tokenizer = None
+        backend = getattr(hf_tokenizer, "backend_tokenizer", None)
+        if backend is not None and backend.pre_tokenizer is not None:
+            self.pre_tokenizer = backend.pre_tokenizer
+
+    def tokenize(self, message: str) -> List[str]:
+        if self.pre_tokenizer is None:
+            return word_tokenize(message)
+        # Offsets index into the original text, which avoids decoding byte-level pieces like "Ġword"
+        pieces = self.pre_tokenizer.pre_tokenize_str(message)
+        return [word for word in (message[start:end].strip() for _, (start, end) in pieces) if word]
+
+    def _iter_tags(self, tokens: List[str], predictions: Optional[Dict[Tuple, str]] = None):
+        """
+        Yields (word, tag) like PerceptronTagger.tag, lazily so callers can stop early.
+        predictions, if given, memoizes the model's tags by everything its features
+        read, and can be shared between the messages of a batch.
+        """
+        tagger = self.tagger
+        prev, prev2 = tagger.START
+        # Features look two words ahead, so the context still covers the whole message
+        context = tagger.START + [tagger.normalize(word) for word in tokens] + tagger.END
+        for i, word in enumerate(tokens):
+            tag = tagger.tagdict.get(word)
+            if not tag:
+                key = None
+                if predictions is not None:
+                    # _get_features reads the word, context[i:i + 5] and the two previous tags
+                    key = (word, prev, prev2, tuple(context[i:i + 5]))
+                    tag = predictions.get(key)
+                if not tag:
+                    features = tagger._get_features(i, word, context, prev, prev2)
+                    tag = tagger.model.predict(features)
+                    if isinstance(tag, tuple):
+                        tag = tag[0]  # NLTK >= 3.5 returns (tag, confidence)
+                    if key is not None:
+                        predictions[key] = tag
+            yield word, tag
+            prev2, prev = prev, tag
+
+    def _phrases(self, tags) -> List[str]:
+        """Collects key phrases from (word, tag) pairs, stopping once max_phrases are found."""
+        limit = self.max_phrases
+        key_phrases = []
+        previous = None
+        for word, tag in tags:
+            # An adjective only counts once the next tag shows it precedes a noun
+            if previous is not None and tag.startswith('NN'):
+                key_phrases.append(f"{previous} {word}")
+                if limit is not None and len(key_phrases) >= limit:
+                    break
+            previous = None
+            if tag.startswith('NN') or tag.startswith('VB'):
+                key_phrases.append(word)
+            elif tag.startswith('JJ'):
+                previous = word
+            if limit is not None and len(key_phrases) >= limit:
+                break
+        return key_phrases
+
+    def extract(self, message: str) -> List[str]:
+        return self._phrases(self._iter_tags(self.tokenize(message)))
+
+    def extract_tokens_batch(self, token_lists: List[List[str]]) -> List[List[str]]:
+        """
+        Extracts key phrases from several tokenized messages with the one cached tagger.
+        Each message stops tagging at its own max_phrases; predictions made for one
+        message are reused by the others wherever their words and tags line up.
+        """
+        predictions = {}
+        return [self._phrases(self._iter_tags(tokens, predictions)) for tokens in token_lists]
+
+    def extract_batch(self, messages: List[str]) -> List[List[str]]:
+        """Same results as extract() for each message; see extract_tokens_batch()."""
+        return self.extract_tokens_batch([self.tokenize(message) for message in messages])
+
+
+# Example usage:
+if __name__ == "__main__":
+    extractor = KeyPhraseExtractor(max_phrases=None)
+    for sample in ["I'm feeling excited about the new job!", "ugh this traffic is making me so angry"]:
+        print(sample, "->", extractor.extract(sample), "| legacy:", legacy_key_phrases(sample))
@@ -1,14 +1,40 @@
 # src/main.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import torch
 import numpy as np
+import json
 import logging
-
+import functools
+import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import ExitStack
+import random
+import time
+
+import config
 from clip_module import TextProcessor    # Your CLIP text processing module
 from gif_processor import GifProcessor    # Your GIF processing module
 from giphy_api import GiphyAPI            # Your Giphy API integration module
 from reply_generator import ReplyGenerator  # New reply generator
+from dialoGPT_reply_generator import DialoGPTReplyGenerator
+from inference_worker import InferenceWorker, QueueFullError
+from admission import AdmissionController, OverloadedError, RateLimiter
+from session_store import DEFAULT_CONVERSATION_ID, create_session_store
+from shared_cache import create_shared_cache
+from http_cache import compress_response, dumps, json_response
+from model_store import load_clip
+import tracing
+from metrics import (
+    REGISTRY,
+    REQUEST_SECONDS,
+    REQUESTS_IN_FLIGHT,
+    REQUESTS_SHED,
+    SamplingFilter,
+    record_cache_lookup,
+    time_stage,
+)
 
 import nltk
 nltk.download('punkt')
@@ -16,27 +42,160 @@ nltk.download('averaged_perceptron_tagger_eng')
 nltk.download('vader_lexicon')
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=getattr(logging, config.LOG_LEVEL.upper(), logging.INFO))
 logger = logging.getLogger(__name__)
+# Per-request detail (messages, analyses, term counts) goes through a sampled logger
+# so that formatting and writing it does not cost time on every request
+request_logger = logging.getLogger(__name__ + ".requests")
+request_logger.addFilter(SamplingFilter(config.LOG_SAMPLE_RATE))
 
 app = Flask(__name__)
+# Debug mode would otherwise pretty-print every jsonify response
+app.config["JSONIFY_PRETTYPRINT_REGULAR"] = False
 CORS(app, resources={r"/*": {"origins": "*"}})
-
-last_message_from_user2 = ""
+if config.TRUSTED_PROXY_COUNT > 0:
+    # remote_addr then comes from X-Forwarded-For, as set by the trusted proxies only
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.TRUSTED_PROXY_COUNT)
+
+# Per-conversation state (last message from user 2, recent analyses and embeddings)
+sessions = create_session_store(
+    config.SESSION_BACKEND,
+    path=config.SESSION_DB_PATH,
+    max_sessions=config.SESSION_MAX_CONVERSATIONS,
+    cache_size=config.SESSION_CACHE_SIZE,
+    max_turns=config.REPLY_CONTEXT_TURNS
+)
+
+# Each inference thread (CLIP text, CLIP image, emotion, intent and optionally DialoGPT) runs its
+# own intra-op pool, so by default the cores are split between them instead of oversubscribed
+inference_thread_count = 5 if config.REPLY_MODEL_ENABLED else 4
+torch_num_threads = config.TORCH_NUM_THREADS or max(1, (os.cpu_count() or 1) // inference_thread_count)
+torch.set_num_threads(torch_num_threads)
+
+worker_options = {
+    "max_batch_size": config.INFERENCE_MAX_BATCH_SIZE,
+    "max_wait_ms": config.INFERENCE_MAX_WAIT_MS,
+    "max_queue_size": config.INFERENCE_QUEUE_SIZE,
+    "timeout": config.INFERENCE_TIMEOUT_S,
+    "retry_after": config.INFERENCE_RETRY_AFTER_S,
+}
 
 # Initialize modules
 try:
-    text_processor = TextProcessor(model_name="ViT-B/32")
-    gif_processor = GifProcessor(model_name="ViT-B/32")
-    reply_generator = ReplyGenerator()
+    clip_options = {
+        "backend": config.CLIP_BACKEND,
+        "artifact_dir": config.CLIP_ARTIFACT_DIR,
+        "num_threads": torch_num_threads,
+    }
+    # One CLIP model serves both towers; with MODEL_DIR its weights are memory-mapped
+    clip = load_clip(config.MODEL_DIR)
+    text_processor = TextProcessor(model_name="ViT-B/32", clip=clip, **clip_options)
+    gif_processor = GifProcessor(model_name="ViT-B/32", clip=clip, **clip_options)
+    # Generated reply text is opt-in: it is the most expensive model in the pipeline
+    reply_model = None
+    if config.REPLY_MODEL_ENABLED:
+        reply_model = DialoGPTReplyGenerator(
+            config.REPLY_MODEL,
+            max_new_tokens=config.REPLY_MAX_NEW_TOKENS,
+            context_turns=config.REPLY_CONTEXT_TURNS,
+            cache_size=config.REPLY_CACHE_SIZE,
+            worker_options=dict(worker_options, max_batch_size=config.REPLY_MAX_BATCH_SIZE,
+                                timeout=config.REPLY_TIMEOUT_S)
+        )
+    reply_generator = ReplyGenerator(worker_options=worker_options, model_dir=config.MODEL_DIR,
+                                     reply_model=reply_model,
+                                     max_key_phrases=config.MAX_KEY_PHRASES or None,
+                                     key_phrase_tokenizer=config.KEY_PHRASE_TOKENIZER)
+    # Model inference runs on dedicated threads; request threads only queue work
+    text_worker = InferenceWorker("clip_text", text_processor.get_text_embeddings, **worker_options)
+    image_worker = InferenceWorker("clip_image", gif_processor.encode_images, **worker_options)
     logger.info("Successfully initialized all modules")
 except Exception as e:
     logger.error(f"Error initializing modules: {str(e)}")
     raise
 
+inference_workers = [text_worker, image_worker, reply_generator.emotion_worker, reply_generator.intent_worker]
+if reply_model is not None:
+    inference_workers.append(reply_model.worker)
+
+
+def inference_pressure():
+    """Fill level of the fullest inference queue, as a fraction of its capacity."""
+    return max(worker.queue_depth() / worker.queue_capacity for worker in inference_workers)
+
+
+# Admission control: per-endpoint concurrency caps, per-client rate limits, degraded mode
+admission = None
+if config.ADMISSION_ENABLED:
+    rate_limiter = None
+    if config.CLIENT_RATE_LIMIT_PER_S > 0:
+        rate_limiter = RateLimiter(config.CLIENT_RATE_LIMIT_PER_S, config.CLIENT_RATE_LIMIT_BURST)
+    admission = AdmissionController(
+        rate_limiter=rate_limiter,
+        pressure_fn=inference_pressure,
+        degrade_pressure=config.DEGRADE_QUEUE_FRACTION,
+        retry_after=config.SHED_RETRY_AFTER_S
+    )
+    for endpoint, (max_concurrent, degrade_at) in config.SUGGEST_ENDPOINT_LIMITS.items():
+        admission.add_endpoint(endpoint, max_concurrent, degrade_at)
+    admission.add_endpoint("search_gifs", config.SEARCH_MAX_CONCURRENT, config.SEARCH_DEGRADE_AT)
+
+
+def admission_controlled(endpoint):
+    """
+    Wraps a view with admission control. Shed requests raise OverloadedError;
+    admitted ones find g.degraded set when the server is overloaded.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if admission is None:
+                g.degraded = False
+                return view(*args, **kwargs)
+            with ExitStack() as stack:
+                # Clients are keyed by address; a client-supplied header would let them pick a fresh bucket
+                g.degraded = stack.enter_context(admission.admit(endpoint, request.remote_addr))
+                if g.degraded:
+                    request_logger.info("Serving %s in degraded mode", endpoint)
+                response = view(*args, **kwargs)
+                if isinstance(response, Response) and response.is_streamed:
+                    # A streamed body is generated after the view returns; hold the slot until it is closed
+                    response.call_on_close(stack.pop_all().close)
+                return response
+        return wrapper
+    return decorator
+
 # Use a new API key - this is a development key, replace with your production key
-giphy_api_key = "GlVGYHkr3WSBnllca54iNt0yFbjz7L65"  # New API key
-giphy = GiphyAPI(giphy_api_key)
+giphy_api_key = config.GIPHY_API_KEY
+# Giphy responses, GIF embeddings and suggestion lists shared between workers (None when disabled)
+shared_cache = create_shared_cache(
+    config.SHARED_CACHE_BACKEND,
+    path=config.SHARED_CACHE_PATH,
+    url=config.SHARED_CACHE_URL,
+    near_size=config.NEAR_CACHE_SIZE,
+    near_ttl=config.NEAR_CACHE_TTL_S
+)
+# Embeddings depend on the encoder backend, so keep each backend's cache entries apart
+gif_embedding_namespace = f"gif_embedding_{config.CLIP_BACKEND}"
+
+giphy = GiphyAPI(giphy_api_key, base_url=config.GIPHY_BASE_URL, shared_cache=shared_cache,
+                 cache_duration=config.GIPHY_CACHE_TTL_S)
+
+# Request tracing (X-Trace header or sampled into TRACE_FILE) and sampled profiling
+trace_writer = tracing.TraceWriter(config.TRACE_FILE) if config.TRACE_FILE else None
+request_profiler = None
+if config.PROFILE_SAMPLE_RATE > 0:
+    request_profiler = tracing.RequestProfiler(config.PROFILE_DIR, use_torch=config.PROFILE_TORCH)
+
+# Local GIF corpus (built with ingest_gifs.py): candidates come from BM25 + FAISS instead of Giphy
+local_retriever = None
+if config.LOCAL_CORPUS_DIR:
+    # Imported here so that deployments using Giphy don't need faiss installed
+    from hybrid_retriever import HybridRetriever
+    local_retriever = HybridRetriever.from_corpus(
+        config.LOCAL_CORPUS_DIR, alpha=config.HYBRID_ALPHA, candidates=config.HYBRID_CANDIDATES
+    )
+    logger.info(f"Loaded local GIF corpus with {len(local_retriever)} GIFs from {config.LOCAL_CORPUS_DIR}")
 
 # Test the Giphy API on startup
 try:
@@ -48,6 +207,327 @@ try:
 except Exception as e:
     logger.error(f"Error testing Giphy API: {str(e)}")
 
+
+def embed_text(text):
+    """Returns the normalized CLIP text embedding as a numpy array of shape (1, embed_dim)."""
+    with time_stage("clip_text_encode"):
+        return text_worker.run(text).unsqueeze(0).cpu().numpy()
+
+
+def embed_gif(url):
+    """
+    Returns the normalized CLIP embedding of a GIF as a numpy array of shape (1, embed_dim).
+    Frames are downloaded and decoded on the request thread; encoding is batched on the image worker.
+    Embeddings are cached in the shared cache tier, so each GIF is encoded once across workers.
+    """
+    with tracing.span("gif_embedding", url=url) as trace_span:
+        if shared_cache is not None:
+            cached = shared_cache.get_embedding(gif_embedding_namespace, url)
+            if trace_span is not None:
+                trace_span.set(cached=cached is not None)
+            if cached is not None:
+                return cached
+        embedding = _compute_gif_embedding(url)
+        if shared_cache is not None:
+            shared_cache.set_embedding(gif_embedding_namespace, url, embedding, ttl=config.EMBEDDING_CACHE_TTL_S)
+        return embedding
+
+
+def _compute_gif_embedding(url):
+    frames = gif_processor.extract_frames(url)
+    with time_stage("frame_preprocess"):
+        images = gif_processor.preprocess_frames(frames)
+    with time_stage("clip_image_encode"):
+        frame_embeddings = image_worker.run_many(images)
+    return gif_processor.average_embeddings(torch.stack(frame_embeddings)).cpu().numpy()
+
+
+def conversation_id_from(data):
+    """Conversation ID from the JSON body or the X-Conversation-ID header; one shared default otherwise."""
+    return (data or {}).get("conversation_id") or request.headers.get("X-Conversation-ID") or DEFAULT_CONVERSATION_ID
+
+
+def record_turn(conversation_id, message):
+    """
+    Records a sent message as a turn of the conversation and returns its earlier turns.
+    Requests without a conversation ID all share the default conversation, so they
+    get no history and their messages are not recorded as anyone's context.
+    """
+    if conversation_id == DEFAULT_CONVERSATION_ID:
+        return []
+    return sessions.record_turn(conversation_id, message)
+
+
+def analyze(conversation_id, message, is_reply, include_reply=False, history=None):
+    """
+    Runs the message analysis, reusing the conversation's cached analysis of the
+    same message (typing, sending and replying often analyse one message twice).
+    Reply text is only generated when include_reply is set; history holds the
+    conversation's earlier turns, oldest first, as context for it.
+    """
+    analysis = sessions.cached_analysis(conversation_id, message)
+    record_cache_lookup("session_analysis", analysis is not None)
+    if analysis is not None:
+        return (reply_generator.generate_reply_text(message, history) if include_reply else ""), analysis
+    generated_reply, analysis = reply_generator.generate_reply(message, is_reply=is_reply, with_text=include_reply,
+                                                               history=history)
+    sessions.cache_analysis(conversation_id, message, analysis)
+    return generated_reply, analysis
+
+
+def conversation_text_embedding(conversation_id, message):
+    """CLIP text embedding of a message, cached per conversation."""
+    embedding = sessions.cached_embedding(conversation_id, message)
+    record_cache_lookup("session_embedding", embedding is not None)
+    if embedding is None:
+        embedding = embed_text(message)
+        sessions.cache_embedding(conversation_id, message, embedding)
+    return embedding
+
+
+def rank_gifs(query, urls, label="", text_embedding=None):
+    """
+    Re-ranks GIF URLs by CLIP similarity to the query.
+    Returns (url, similarity) pairs, best first, for the GIFs that could be embedded.
+    text_embedding, if given, is the query's precomputed embedding.
+    """
+    text_embedding_np = text_embedding if text_embedding is not None else embed_text(query)
+
+    gif_data = []
+    for url in urls:
+        try:
+            gif_data.append((url, embed_gif(url)))
+        except (QueueFullError, FutureTimeoutError):
+            # The image queue is backed up; every further GIF would wait out another full timeout
+            raise
+        except Exception as e:
+            logger.warning(f"Error processing {label}GIF {url}: {str(e)}")
+            continue
+
+    with time_stage("ranking"):
+        similarities = []
+        for url, emb in gif_data:
+            sim = float(np.dot(text_embedding_np, emb.T))
+            similarities.append((url, sim))
+
+        similarities.sort(key=lambda x: x[1], reverse=True)
+    return similarities
+
+
+def suggest_gifs(message, is_reply, label, conversation_id=DEFAULT_CONVERSATION_ID,
+                 include_reply=False, degraded=False):
+    """
+    Shared pipeline behind the suggestion endpoints: analyse the message,
+    search Giphy for each generated term, and re-rank the results with CLIP.
+    label is used in log and error messages ("text ", "reply ", or "").
+    In degraded mode CLIP re-ranking is skipped and the Giphy order is returned unranked.
+    Fully ranked results are kept in the shared cache and served again for the same message
+    (and, when they include reply text, the same conversation context).
+    """
+    history = []
+    if is_reply or include_reply:
+        # A message being replied to has been sent, so it becomes a turn of the conversation
+        history = record_turn(conversation_id, message)
+    suggestion_key = f"{int(is_reply)}:{int(include_reply)}:{message}"
+    if include_reply:
+        # The reply text depends on the earlier turns too
+        suggestion_key += "\x1e" + json.dumps(history)
+    if shared_cache is not None:
+        cached = shared_cache.get_json("suggestions", suggestion_key)
+        if cached is not None:
+            return json_response(cached)
+
+    try:
+        # Generate a reply and get analysis
+        # Reply text generation is skipped in degraded mode along with CLIP re-ranking
+        generated_reply, analysis = analyze(conversation_id, message, is_reply,
+                                            include_reply=include_reply and not degraded, history=history)
+        request_logger.info("Generated %sanalysis: %s", label, analysis)
+    except QueueFullError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in {label}analysis: {str(e)}")
+        return jsonify({"error": f"Reply generation failed: {str(e)}"}), 500
+
+    try:
+        # Get search terms for GIFs
+        with time_stage("term_generation"):
+            search_terms = reply_generator.get_gif_search_terms(message, analysis, is_reply=is_reply)
+        request_logger.info("%ssearch terms for '%s': %s", label.capitalize(), message, search_terms)
+    except Exception as e:
+        logger.error(f"Error generating {label}search terms: {str(e)}")
+        return jsonify({"error": f"Search term generation failed: {str(e)}"}), 500
+
+    def respond(suggested_gifs, similarity_scores, ranked=True, clip_similarities=None):
+        body = {}
+        if include_reply:
+            body["generated_reply"] = generated_reply
+        body.update({
+            "message_analysis": analysis,
+            "search_terms": search_terms,
+            "suggested_gifs": suggested_gifs,
+            "similarity_scores": similarity_scores,
+            "ranked": ranked
+        })
+        if clip_similarities is not None:
+            body["clip_similarities"] = clip_similarities
+        # Only complete, ranked answers are worth sharing; fallbacks should be retried
+        if ranked and shared_cache is not None:
+            shared_cache.set_json("suggestions", suggestion_key, body, ttl=config.SUGGESTION_CACHE_TTL_S)
+        return json_response(body)
+
+    if local_retriever is not None:
+        try:
+            # Degraded mode skips the CLIP text encoder and ranks by keywords alone
+            text_embedding = None if degraded else conversation_text_embedding(conversation_id, message)
+            with time_stage("local_retrieval"):
+                results = local_retriever.search(search_terms, text_embedding, top_k=6)
+            if results:
+                request_logger.info("Found %d %sGIFs in the local corpus", len(results), label)
+                # Scores are the fused ones the results are ordered by; the raw CLIP cosines come separately
+                clip_similarities = None
+                if text_embedding is not None:
+                    clip_similarities = [similarity for _, _, similarity in results]
+                return respond([meta["url"] for meta, _, _ in results], [score for _, score, _ in results],
+                               ranked=text_embedding is not None, clip_similarities=clip_similarities)
+        except QueueFullError:
+            raise
+        except Exception as e:
+            logger.warning(f"Error searching the local corpus for {label}GIFs: {str(e)}")
+        # Nothing usable locally: fall back to Giphy
+
+    # Search for GIFs using all search terms
+    all_gifs = []
+    for term in search_terms:
+        try:
+            gifs = giphy.search_gifs(term, limit=3)  # Reduced limit to avoid rate limiting
+            request_logger.info("Found %d %sGIFs for term '%s'", len(gifs), label, term)
+            all_gifs.extend(gifs)
+        except Exception as e:
+            logger.error(f"Error searching for {label}term '{term}': {str(e)}")
+            continue
+
+    # Remove duplicates while preserving order
+    all_gifs = list(dict.fromkeys(all_gifs))
+    request_logger.info("Total unique %sGIFs found: %d", label, len(all_gifs))
+
+    if not all_gifs:
+        logger.warning(f"No {label}GIFs found for any search terms")
+        return respond([], [], ranked=False)
+
+    if degraded:
+        # Overloaded: skip the CLIP forward passes and keep Giphy's order
+        return respond(all_gifs[:6], [1.0] * min(6, len(all_gifs)), ranked=False)
+
+    try:
+        # Compute CLIP embeddings for re-ranking the GIFs
+        text_embedding = conversation_text_embedding(conversation_id, message)
+        similarities = rank_gifs(message, all_gifs, label, text_embedding=text_embedding)
+    except QueueFullError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in CLIP processing for {label}GIFs: {str(e)}")
+        similarities = []
+
+    if not similarities:
+        logger.warning(f"No valid {label}GIF embeddings generated")
+        # Return unranked GIFs if CLIP fails
+        return respond(all_gifs[:6], [1.0] * min(6, len(all_gifs)), ranked=False)
+
+    top_results = similarities[:6]
+    request_logger.info("Successfully ranked %d %sGIFs", len(top_results), label)
+    return respond([item[0] for item in top_results], [item[1] for item in top_results])
+
+
+@app.errorhandler(QueueFullError)
+@app.errorhandler(OverloadedError)
+def handle_overloaded(e):
+    """Reject work quickly when admission control sheds it or an inference queue is saturated."""
+    # Shedding happens in bursts; REQUESTS_SHED counts every one, the log only a sample
+    request_logger.warning("Shed %s: %s", request.endpoint, e)
+    REQUESTS_SHED.labels(request.endpoint or "unknown").inc()
+    response = jsonify({
+        "error": "Server is busy, please retry shortly",
+        "suggested_gifs": [],
+        "similarity_scores": []
+    })
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or "unknown"
+    REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).inc()
+
+@app.before_request
+def start_trace_and_profile():
+    """Opt-in tracing (X-Trace header or sampling) and sampled profiling of single requests."""
+    g.trace = None
+    g.trace_in_response = config.TRACE_HEADER_ENABLED and request.headers.get("X-Trace", "") not in ("", "0")
+    if g.trace_in_response or (trace_writer is not None and random.random() < config.TRACE_SAMPLE_RATE):
+        g.trace = tracing.Trace(g.metrics_endpoint, method=request.method, path=request.path)
+    g.profile = None
+    if request_profiler is not None and random.random() < config.PROFILE_SAMPLE_RATE:
+        g.profile = request_profiler.start(g.metrics_endpoint)
+
+@app.after_request
+def record_request_metrics(response):
+    REQUEST_SECONDS.labels(g.metrics_endpoint, response.status_code).observe(
+        time.perf_counter() - g.request_start
+    )
+    return response
+
+@app.after_request
+def compress(response):
+    if not config.COMPRESS_RESPONSES:
+        return response
+    return compress_response(response, min_size=config.COMPRESS_MIN_BYTES, level=config.COMPRESS_LEVEL)
+
+@app.after_request
+def attach_trace(response):
+    # Registered last, so it runs before compression and sees the plain JSON body
+    trace = g.get("trace")
+    if trace is None:
+        return response
+    trace.finish()
+    trace.root.set(status=response.status_code)
+    response.headers["X-Trace-Id"] = trace.trace_id
+    if (g.trace_in_response and response.mimetype == "application/json"
+            and not response.is_streamed and response.status_code != 304):
+        body = json.loads(response.get_data() or b"null")
+        if isinstance(body, dict):
+            body["trace"] = trace.to_dict()
+            response.set_data(dumps(body))
+            # A traced body is unique to this request
+            response.headers.pop("ETag", None)
+            response.cache_control.no_store = True
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if "metrics_endpoint" in g:
+        REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).dec()
+
+@app.teardown_request
+def finish_trace_and_profile(exc):
+    trace = g.get("trace")
+    if trace is not None:
+        trace.finish()
+        if exc is not None:
+            trace.root.set(error=type(exc).__name__)
+        if trace_writer is not None:
+            trace_writer.write(trace)
+    if g.get("profile") is not None:
+        paths = request_profiler.stop(g.profile)
+        logger.info(f"Wrote request profile to {', '.join(paths)}")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus-format metrics: stage latencies, cache hit ratios, in-flight requests, inference queues."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/')
 def home():
     return "Welcome to the GIF Chat App API!"
@@ -57,57 +537,65 @@ def get_trending_gifs():
     try:
         # Get trending GIFs from Giphy
         gifs = giphy.get_trending_gifs(limit=15)  # Limit to 15 trending GIFs
-        logger.info(f"Found {len(gifs)} trending GIFs")
-        return jsonify({"gifs": gifs})
+        request_logger.info("Found %d trending GIFs", len(gifs))
+        # Every client gets the same list, so browsers and CDNs may share it. The Giphy client
+        # returns an empty list when the call fails, and an outage must not be cached downstream.
+        return json_response({"gifs": gifs}, max_age=config.TRENDING_MAX_AGE_S if gifs else 0)
     except Exception as e:
         logger.error(f"Error getting trending GIFs: {str(e)}")
         return jsonify({"error": str(e), "gifs": []}), 500
 
-@app.route('/search_gifs', methods=['POST'])
+@app.route('/search_gifs', methods=['GET', 'POST'])
+@admission_controlled("search_gifs")
 def search_gifs():
+    """
+    GET /search_gifs?q=... is cacheable (ETag, Cache-Control, 304 on If-None-Match);
+    POST with {"query": ...} is kept for older clients.
+    """
     try:
-        data = request.get_json()
-        query = data.get("query", "")
-        
+        if request.method == 'GET':
+            query = request.args.get("q", "").strip()
+            max_age = config.SEARCH_MAX_AGE_S
+        else:
+            data = request.get_json()
+            query = data.get("query", "")
+            max_age = None
+
         if not query:
             return jsonify({"error": "No search query provided"}), 400
 
-        logger.info(f"Searching GIFs for query: {query}")
+        if shared_cache is not None:
+            cached = shared_cache.get_json("search", query)
+            if cached is not None:
+                return json_response(cached, max_age=max_age)
+
+        request_logger.info("Searching GIFs for query: %s", query)
         
         # Search GIFs using the query
         gifs = giphy.search_gifs(query, limit=15)  # Limit to 15 search results
-        logger.info(f"Found {len(gifs)} GIFs for query: {query}")
+        request_logger.info("Found %d GIFs for query: %s", len(gifs), query)
         
         # If we have CLIP embeddings, we can re-rank the results
-        try:
-            text_embedding = text_processor.get_text_embedding(query)
-            text_embedding_np = text_embedding.cpu().numpy()
-
-            gif_data = []
-            for url in gifs:
-                try:
-                    gif_embedding = gif_processor.get_gif_embedding(url)
-                    gif_embedding_np = gif_embedding.cpu().numpy()
-                    gif_data.append((url, gif_embedding_np))
-                except Exception as e:
-                    logger.warning(f"Error processing GIF {url}: {str(e)}")
-                    continue
-
-            if gif_data:
-                similarities = []
-                for url, emb in gif_data:
-                    sim = float(np.dot(text_embedding_np, emb.T))
-                    similarities.append((url, sim))
-                
-                similarities.sort(key=lambda x: x[1], reverse=True)
-                gifs = [item[0] for item in similarities]
-                logger.info("Successfully re-ranked GIFs using CLIP")
-        except Exception as e:
-            logger.warning(f"Error during CLIP processing: {str(e)}")
-            # If CLIP fails, we'll just use the original Giphy results
-            pass
-
-        return jsonify({"gifs": gifs})
+        ranked = False
+        if not g.degraded:
+            try:
+                similarities = rank_gifs(query, gifs)
+                if similarities:
+                    gifs = [item[0] for item in similarities]
+                    ranked = True
+                    request_logger.info("Successfully re-ranked GIFs using CLIP")
+            except Exception as e:
+                logger.warning(f"Error during CLIP processing: {str(e)}")
+                # If CLIP fails or is saturated, we'll just use the original Giphy results
+                pass
+
+        body = {"gifs": gifs, "ranked": ranked}
+        if not ranked:
+            # Unranked fallbacks should not be kept by clients, proxies or the shared cache
+            return json_response(body, max_age=0 if max_age else None)
+        if shared_cache is not None:
+            shared_cache.set_json("search", query, body, ttl=config.SEARCH_MAX_AGE_S)
+        return json_response(body, max_age=max_age)
     except Exception as e:
         logger.error(f"Error searching GIFs: {str(e)}")
         return jsonify({"error": str(e), "gifs": []}), 500
@@ -120,13 +608,14 @@ def send_message_user2():
         if not message:
             return jsonify({"error": "No message provided"}), 400
             
-        global last_message_from_user2
-        last_message_from_user2 = message
-        return jsonify({"message": message, "info": "User 2's message stored."})
+        conversation_id = conversation_id_from(data)
+        sessions.set_last_message(conversation_id, message)
+        return jsonify({"message": message, "conversation_id": conversation_id, "info": "User 2's message stored."})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/generate_reply_and_gifs', methods=['POST'])
+@admission_controlled("generate_reply_and_gifs")
 def generate_reply_and_gifs():
     try:
         data = request.get_json()
@@ -135,102 +624,11 @@ def generate_reply_and_gifs():
         if not message:
             return jsonify({"error": "No message provided"}), 400
 
-        logger.info(f"Generating reply for message: {message}")
-
-        try:
-            # Generate a reply and get analysis
-            generated_reply, analysis = reply_generator.generate_reply(message)
-            logger.info(f"Generated analysis: {analysis}")
-        except Exception as e:
-            logger.error(f"Error in reply generation: {str(e)}")
-            return jsonify({"error": f"Reply generation failed: {str(e)}"}), 500
-
-        try:
-            # Get search terms for GIFs
-            search_terms = reply_generator.get_gif_search_terms(message, analysis)
-            logger.info(f"Search terms for '{message}': {search_terms}")
-        except Exception as e:
-            logger.error(f"Error generating search terms: {str(e)}")
-            return jsonify({"error": f"Search term generation failed: {str(e)}"}), 500
-        
-        # Search for GIFs using all search terms
-        all_gifs = []
-        for term in search_terms:
-            try:
-                gifs = giphy.search_gifs(term, limit=3)  # Reduced limit to avoid rate limiting
-                logger.info(f"Found {len(gifs)} GIFs for term '{term}'")
-                all_gifs.extend(gifs)
-            except Exception as e:
-                logger.error(f"Error searching for term '{term}': {str(e)}")
-                continue
-        
-        # Remove duplicates while preserving order
-        all_gifs = list(dict.fromkeys(all_gifs))
-        logger.info(f"Total unique GIFs found: {len(all_gifs)}")
-        
-        if not all_gifs:
-            logger.warning("No GIFs found for any search terms")
-            return jsonify({
-                "generated_reply": generated_reply,
-                "message_analysis": analysis,
-                "search_terms": search_terms,
-                "suggested_gifs": [],
-                "similarity_scores": []
-            })
-
-        try:
-            # Compute CLIP embedding for re-ranking the GIFs
-            text_embedding = text_processor.get_text_embedding(message)
-            text_embedding_np = text_embedding.cpu().numpy()
-
-            gif_data = []
-            for url in all_gifs:
-                try:
-                    gif_embedding = gif_processor.get_gif_embedding(url)
-                    gif_embedding_np = gif_embedding.cpu().numpy()
-                    gif_data.append((url, gif_embedding_np))
-                except Exception as e:
-                    logger.warning(f"Error processing GIF {url}: {str(e)}")
-                    continue
-
-            if not gif_data:
-                logger.warning("No valid GIF embeddings generated")
-                return jsonify({
-                    "generated_reply": generated_reply,
-                    "message_analysis": analysis,
-                    "search_terms": search_terms,
-                    "suggested_gifs": all_gifs[:6],  # Return unranked GIFs if CLIP fails
-                    "similarity_scores": [1.0] * min(6, len(all_gifs))
-                })
-            
-            similarities = []
-            for url, emb in gif_data:
-                sim = float(np.dot(text_embedding_np, emb.T))
-                similarities.append((url, sim))
-            
-            similarities.sort(key=lambda x: x[1], reverse=True)
-            top_results = similarities[:6]
-            suggested_gifs = [item[0] for item in top_results]
-            similarity_scores = [item[1] for item in top_results]
-
-            logger.info(f"Successfully ranked {len(suggested_gifs)} GIFs")
-            return jsonify({
-                "generated_reply": generated_reply,
-                "message_analysis": analysis,
-                "search_terms": search_terms,
-                "suggested_gifs": suggested_gifs,
-                "similarity_scores": similarity_scores
-            })
-        except Exception as e:
-            logger.error(f"Error in CLIP processing: {str(e)}")
-            # If CLIP fails, return unranked GIFs
-            return jsonify({
-                "generated_reply": generated_reply,
-                "message_analysis": analysis,
-                "search_terms": search_terms,
-                "suggested_gifs": all_gifs[:6],
-                "similarity_scores": [1.0] * min(6, len(all_gifs))
-            })
+        request_logger.info("Generating reply for message: %s", message)
+        return suggest_gifs(message, is_reply=False, label="", conversation_id=conversation_id_from(data),
+                            include_reply=True, degraded=g.degraded)
+    except QueueFullError:
+        raise
     except Exception as e:
         logger.error(f"Error in generate_reply_and_gifs: {str(e)}")
         return jsonify({
@@ -240,6 +638,7 @@ def generate_reply_and_gifs():
         }), 500
 
 @app.route('/generate_reply_gifs', methods=['POST'])
+@admission_controlled("generate_reply_gifs")
 def generate_reply_gifs():
     try:
         data = request.get_json()
@@ -248,98 +647,11 @@ def generate_reply_gifs():
         if not message:
             return jsonify({"error": "No message provided"}), 400
 
-        logger.info(f"Generating reply GIFs for message: {message}")
-
-        try:
-            # Generate a reply and get analysis with is_reply=True
-            generated_reply, analysis = reply_generator.generate_reply(message, is_reply=True)
-            logger.info(f"Generated analysis for reply: {analysis}")
-        except Exception as e:
-            logger.error(f"Error in reply generation: {str(e)}")
-            return jsonify({"error": f"Reply generation failed: {str(e)}"}), 500
-
-        try:
-            # Get search terms for GIFs with is_reply=True
-            search_terms = reply_generator.get_gif_search_terms(message, analysis, is_reply=True)
-            logger.info(f"Reply search terms for '{message}': {search_terms}")
-        except Exception as e:
-            logger.error(f"Error generating reply search terms: {str(e)}")
-            return jsonify({"error": f"Search term generation failed: {str(e)}"}), 500
-        
-        # Search for GIFs using all search terms
-        all_gifs = []
-        for term in search_terms:
-            try:
-                gifs = giphy.search_gifs(term, limit=3)
-                logger.info(f"Found {len(gifs)} reply GIFs for term '{term}'")
-                all_gifs.extend(gifs)
-            except Exception as e:
-                logger.error(f"Error searching for reply term '{term}': {str(e)}")
-                continue
-        
-        # Remove duplicates while preserving order
-        all_gifs = list(dict.fromkeys(all_gifs))
-        logger.info(f"Total unique reply GIFs found: {len(all_gifs)}")
-        
-        if not all_gifs:
-            logger.warning("No reply GIFs found for any search terms")
-            return jsonify({
-                "message_analysis": analysis,
-                "search_terms": search_terms,
-                "suggested_gifs": [],
-                "similarity_scores": []
-            })
-
-        try:
-            # Compute CLIP embedding for re-ranking the GIFs
-            text_embedding = text_processor.get_text_embedding(message)
-            text_embedding_np = text_embedding.cpu().numpy()
-
-            gif_data = []
-            for url in all_gifs:
-                try:
-                    gif_embedding = gif_processor.get_gif_embedding(url)
-                    gif_embedding_np = gif_embedding.cpu().numpy()
-                    gif_data.append((url, gif_embedding_np))
-                except Exception as e:
-                    logger.warning(f"Error processing reply GIF {url}: {str(e)}")
-                    continue
-
-            if not gif_data:
-                logger.warning("No valid reply GIF embeddings generated")
-                return jsonify({
-                    "message_analysis": analysis,
-                    "search_terms": search_terms,
-                    "suggested_gifs": all_gifs[:6],
-                    "similarity_scores": [1.0] * min(6, len(all_gifs))
-                })
-            
-            similarities = []
-            for url, emb in gif_data:
-                sim = float(np.dot(text_embedding_np, emb.T))
-                similarities.append((url, sim))
-            
-            similarities.sort(key=lambda x: x[1], reverse=True)
-            top_results = similarities[:6]
-            suggested_gifs = [item[0] for item in top_results]
-            similarity_scores = [item[1] for item in top_results]
-
-            logger.info(f"Successfully ranked {len(suggested_gifs)} reply GIFs")
-            return jsonify({
-                "message_analysis": analysis,
-                "search_terms": search_terms,
-                "suggested_gifs": suggested_gifs,
-                "similarity_scores": similarity_scores
-            })
-        except Exception as e:
-            logger.error(f"Error in CLIP processing for replies: {str(e)}")
-            # If CLIP fails, return unranked GIFs
-            return jsonify({
-                "message_analysis": analysis,
-                "search_terms": search_terms,
-                "suggested_gifs": all_gifs[:6],
-                "similarity_scores": [1.0] * min(6, len(all_gifs))
-            })
+        request_logger.info("Generating reply GIFs for message: %s", message)
+        return suggest_gifs(message, is_reply=True, label="reply ",
+                            conversation_id=conversation_id_from(data), degraded=g.degraded)
+    except QueueFullError:
+        raise
     except Exception as e:
         logger.error(f"Error in generate_reply_gifs: {str(e)}")
         return jsonify({
@@ -349,6 +661,7 @@ def generate_reply_gifs():
         }), 500
 
 @app.route('/generate_text_gifs', methods=['POST'])
+@admission_controlled("generate_text_gifs")
 def generate_text_gifs():
     try:
         data = request.get_json()
@@ -357,98 +670,11 @@ def generate_text_gifs():
         if not message:
             return jsonify({"error": "No message provided"}), 400
 
-        logger.info(f"Generating text GIFs for message: {message}")
-
-        try:
-            # Generate a reply and get analysis with is_reply=False
-            generated_reply, analysis = reply_generator.generate_reply(message, is_reply=False)
-            logger.info(f"Generated analysis for text: {analysis}")
-        except Exception as e:
-            logger.error(f"Error in text analysis: {str(e)}")
-            return jsonify({"error": f"Text analysis failed: {str(e)}"}), 500
-
-        try:
-            # Get search terms for GIFs with is_reply=False
-            search_terms = reply_generator.get_gif_search_terms(message, analysis, is_reply=False)
-            logger.info(f"Text search terms for '{message}': {search_terms}")
-        except Exception as e:
-            logger.error(f"Error generating text search terms: {str(e)}")
-            return jsonify({"error": f"Search term generation failed: {str(e)}"}), 500
-        
-        # Search for GIFs using all search terms
-        all_gifs = []
-        for term in search_terms:
-            try:
-                gifs = giphy.search_gifs(term, limit=3)
-                logger.info(f"Found {len(gifs)} text GIFs for term '{term}'")
-                all_gifs.extend(gifs)
-            except Exception as e:
-                logger.error(f"Error searching for text term '{term}': {str(e)}")
-                continue
-        
-        # Remove duplicates while preserving order
-        all_gifs = list(dict.fromkeys(all_gifs))
-        logger.info(f"Total unique text GIFs found: {len(all_gifs)}")
-        
-        if not all_gifs:
-            logger.warning("No text GIFs found for any search terms")
-            return jsonify({
-                "message_analysis": analysis,
-                "search_terms": search_terms,
-                "suggested_gifs": [],
-                "similarity_scores": []
-            })
-
-        try:
-            # Compute CLIP embedding for re-ranking the GIFs
-            text_embedding = text_processor.get_text_embedding(message)
-            text_embedding_np = text_embedding.cpu().numpy()
-
-            gif_data = []
-            for url in all_gifs:
-                try:
-                    gif_embedding = gif_processor.get_gif_embedding(url)
-                    gif_embedding_np = gif_embedding.cpu().numpy()
-                    gif_data.append((url, gif_embedding_np))
-                except Exception as e:
-                    logger.warning(f"Error processing text GIF {url}: {str(e)}")
-                    continue
-
-            if not gif_data:
-                logger.warning("No valid text GIF embeddings generated")
-                return jsonify({
-                    "message_analysis": analysis,
-                    "search_terms": search_terms,
-                    "suggested_gifs": all_gifs[:6],
-                    "similarity_scores": [1.0] * min(6, len(all_gifs))
-                })
-            
-            similarities = []
-            for url, emb in gif_data:
-                sim = float(np.dot(text_embedding_np, emb.T))
-                similarities.append((url, sim))
-            
-            similarities.sort(key=lambda x: x[1], reverse=True)
-            top_results = similarities[:6]
-            suggested_gifs = [item[0] for item in top_results]
-            similarity_scores = [item[1] for item in top_results]
-
-            logger.info(f"Successfully ranked {len(suggested_gifs)} text GIFs")
-            return jsonify({
-                "message_analysis": analysis,
-                "search_terms": search_terms,
-                "suggested_gifs": suggested_gifs,
-                "similarity_scores": similarity_scores
-            })
-        except Exception as e:
-            logger.error(f"Error in CLIP processing for text: {str(e)}")
-            # If CLIP fails, return unranked GIFs
-            return jsonify({
-                "message_analysis": analysis,
-                "search_terms": search_terms,
-                "suggested_gifs": all_gifs[:6],
-                "similarity_scores": [1.0] * min(6, len(all_gifs))
-            })
+        request_logger.info("Generating text GIFs for message: %s", message)
+        return suggest_gifs(message, is_reply=False, label="text ",
+                            conversation_id=conversation_id_from(data), degraded=g.degraded)
+    except QueueFullError:
+        raise
     except Exception as e:
         logger.error(f"Error in generate_text_gifs: {str(e)}")
         return jsonify({
@@ -457,5 +683,49 @@ def generate_text_gifs():
             "similarity_scores": []
         }), 500
 
+@app.route('/stream_reply', methods=['POST'])
+@admission_controlled("stream_reply")
+def stream_reply():
+    """
+    Streams a generated reply as server-sent events: one {"text": ...} event per
+    chunk of tokens, then a "done" event. Needs REPLY_MODEL_ENABLED.
+    The admission slot is held until the stream ends.
+    """
+    if reply_model is None:
+        return jsonify({"error": "Reply generation is not enabled"}), 404
+    data = request.get_json(silent=True) or {}
+    message = data.get("message", "")
+    if not message:
+        return jsonify({"error": "No message provided"}), 400
+    if g.degraded:
+        # Reply generation is the first thing dropped under load, as in suggest_gifs
+        raise OverloadedError("Reply streaming is paused while the server is overloaded",
+                              retry_after=config.SHED_RETRY_AFTER_S)
+    history = record_turn(conversation_id_from(data), message)
+
+    def events():
+        try:
+            for chunk in reply_model.stream(history + [message], timeout=config.REPLY_TIMEOUT_S):
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming reply: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
+
+@app.route('/inference_stats', methods=['GET'])
+def inference_stats():
+    """Queue depth, wait-time and batch-size histograms for each inference worker."""
+    return jsonify({worker.name: worker.stats() for worker in inference_workers})
+
+@app.route('/admission_stats', methods=['GET'])
+def admission_stats():
+    """In-flight and shed counts per endpoint, and the number of rate-limited requests."""
+    if admission is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(admission.stats(), enabled=True, inference_pressure=inference_pressure()))
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
@@ -0,0 +1,258 @@
+# src/metrics.py
+import bisect
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import span
+
+# Default latency buckets in seconds
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Gauge:
+    def __init__(self):
+        self._value = 0.0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        """Report the return value of function() instead of a stored value."""
+        self._function = function
+
+    @property
+    def value(self):
+        return self._function() if self._function is not None else self._value
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is the +Inf bucket
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record a single observation."""
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the wall-clock duration of the with-block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        """
+        Returns a consistent copy of the histogram as a dict with
+        cumulative bucket counts, the total count and the sum.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "count": count, "sum": total}
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class MetricFamily:
+    """A named metric with a fixed set of label names and one child metric per label combination."""
+
+    def __init__(self, name, documentation, metric_type, labelnames=(), child_factory=None):
+        self.name = name
+        self.documentation = documentation
+        self.type = metric_type
+        self.labelnames = tuple(labelnames)
+        self._child_factory = child_factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        """Returns the child metric for the given label values, creating it on first use."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._child_factory())
+        return child
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key, child in self.children():
+            pairs = list(zip(self.labelnames, key))
+            if self.type == "histogram":
+                snapshot = child.snapshot()
+                for bound, count in snapshot["buckets"]:
+                    le = bound if bound == "+Inf" else _format_value(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', le)])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(snapshot['sum'])}")
+                lines.append(f"{self.name}_count{_format_labels(pairs)} {snapshot['count']}")
+            else:
+                lines.append(f"{self.name}{_format_labels(pairs)} {_format_value(child.value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, documentation, metric_type, labelnames, child_factory):
+        with self._lock:
+            if name not in self._families:
+                self._families[name] = MetricFamily(name, documentation, metric_type, labelnames, child_factory)
+            return self._families[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(name, documentation, "counter", labelnames, Counter)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(name, documentation, "gauge", labelnames, Gauge)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._register(name, documentation, "histogram", labelnames, lambda: Histogram(buckets))
+
+    def render(self):
+        """Renders every metric in the Prometheus text exposition format."""
+        with self._lock:
+            families = list(self._families.values())
+        lines = []
+        for family in families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Per-stage latency of the suggestion pipeline
+STAGE_SECONDS = REGISTRY.histogram(
+    "gif_stage_seconds", "Time spent in each pipeline stage", ["stage"]
+)
+
+# HTTP requests
+REQUEST_SECONDS = REGISTRY.histogram(
+    "gif_http_request_seconds", "HTTP request latency by endpoint and status", ["endpoint", "status"]
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "gif_http_requests_in_flight", "Requests currently being served", ["endpoint"]
+)
+REQUESTS_SHED = REGISTRY.counter(
+    "gif_http_requests_shed_total", "Requests rejected by admission control or full inference queues", ["endpoint"]
+)
+
+# Caches
+CACHE_LOOKUPS = REGISTRY.counter(
+    "gif_cache_lookups_total", "Cache lookups by cache and result (hit or miss)", ["cache", "result"]
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "gif_cache_hit_ratio", "Fraction of cache lookups that were hits since start", ["cache"]
+)
+
+# Inference workers
+INFERENCE_WAIT_SECONDS = REGISTRY.histogram(
+    "gif_inference_queue_wait_seconds", "Time items wait in an inference queue", ["model"]
+)
+INFERENCE_BATCH_SECONDS = REGISTRY.histogram(
+    "gif_inference_batch_seconds", "Forward-pass time per inference batch", ["model"]
+)
+INFERENCE_BATCH_SIZE = REGISTRY.histogram(
+    "gif_inference_batch_size", "Items per inference batch", ["model"], buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+INFERENCE_QUEUE_DEPTH = REGISTRY.gauge(
+    "gif_inference_queue_depth", "Items waiting in an inference queue", ["model"]
+)
+INFERENCE_REJECTED = REGISTRY.counter(
+    "gif_inference_rejected_total", "Items rejected because an inference queue was full", ["model"]
+)
+
+
+@contextmanager
+def time_stage(stage, **attributes):
+    """
+    Context manager recording the duration of one pipeline stage.
+    When the request is traced, the stage is also recorded as a span with these attributes.
+    """
+    with span(stage, **attributes):
+        with STAGE_SECONDS.labels(stage).time():
+            yield
+
+
+def record_cache_lookup(cache, hit):
+    """Count a cache hit or miss and refresh that cache's hit ratio."""
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+    hits = CACHE_LOOKUPS.labels(cache, "hit").value
+    misses = CACHE_LOOKUPS.labels(cache, "miss").value
+    CACHE_HIT_RATIO.labels(cache).set(hits / (hits + misses))
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through only a random fraction of records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
@@ -0,0 +1,311 @@
+# src/model_store.py
+"""
+Pre-serialized model weights for fast, memory-shared worker startup.
+
+The prepare step downloads CLIP and the two Hugging Face classifiers once
+and writes them to a local directory:
+
+    models/
+      manifest.json
+      clip/weights.safetensors            CLIP ViT-B-32 (openai)
+      emotion/weights.safetensors, config.json, tokenizer files
+      intent/weights.safetensors, config.json, tokenizer files
+
+At startup the weight files are memory-mapped and the tensors are used in
+place, without deserializing or copying them. The mapping is private
+copy-on-write, so every worker process on the host reads the same pages
+from the OS page cache. Models are built on the meta device where possible,
+so no time is spent initializing weights that are about to be replaced.
+
+    python src/model_store.py prepare --model-dir models/
+    MODEL_DIR=models/ python src/main.py
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from itertools import chain
+
+import torch
+import torch.nn as nn
+import open_clip
+
+logger = logging.getLogger(__name__)
+
+CLIP_MODEL = "ViT-B-32"
+CLIP_PRETRAINED = "openai"
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+INTENT_MODEL = "facebook/bart-large-mnli"
+
+WEIGHTS_FILE = "weights.safetensors"
+MANIFEST = "manifest.json"
+
+_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def save_module(module, path, metadata=None):
+    """
+    Writes every parameter and buffer of module to a safetensors file.
+    Tied tensors are stored once; their other names are recorded as aliases.
+    """
+    try:
+        from safetensors.torch import save_file
+    except ImportError:
+        raise ImportError("Preparing models needs the safetensors package: pip install safetensors")
+    tensors, aliases, seen = {}, {}, {}
+    named = chain(module.named_parameters(remove_duplicate=False), module.named_buffers(remove_duplicate=False))
+    for name, tensor in named:
+        if id(tensor) in seen:
+            aliases[name] = seen[id(tensor)]
+            continue
+        seen[id(tensor)] = name
+        tensors[name] = tensor.detach().cpu().contiguous()
+    metadata = dict(metadata or {}, aliases=json.dumps(aliases))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    save_file(tensors, path, metadata=metadata)
+
+
+def load_safetensors_mmap(path):
+    """
+    Maps a safetensors file and returns (tensors, metadata) whose tensors point into the mapping.
+    Nothing is read until a tensor is used.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        # ACCESS_COPY maps privately: reads share the page cache, any write stays in this process
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    metadata = header.pop("__metadata__", None) or {}
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        dtype = _DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        if end == start:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + start)
+        tensors[name] = tensor.reshape(info["shape"])
+    return tensors, metadata
+
+
+def load_module_weights(module, path):
+    """
+    Points module's parameters and buffers at the memory-mapped tensors in path.
+    Works on modules built on the meta device; raises ValueError if anything is left unset.
+    """
+    tensors, metadata = load_safetensors_mmap(path)
+    aliases = json.loads(metadata.get("aliases", "{}"))
+    names_by_tensor = {name: [name] for name in tensors}
+    for alias, name in aliases.items():
+        names_by_tensor[name].append(alias)
+
+    for name, tensor in tensors.items():
+        value = None
+        for target in names_by_tensor[name]:
+            prefix, _, attr = target.rpartition(".")
+            owner = module.get_submodule(prefix)
+            if attr in owner._parameters:
+                if value is None:
+                    value = nn.Parameter(tensor, requires_grad=False)
+                owner._parameters[attr] = value
+            elif attr in owner._buffers:
+                owner._buffers[attr] = tensor
+            else:
+                raise ValueError(f"{path} has weights for '{target}', which the model does not have")
+
+    named = chain(module.named_parameters(remove_duplicate=False), module.named_buffers(remove_duplicate=False))
+    missing = [name for name, tensor in named if tensor.is_meta]
+    if missing:
+        raise ValueError(f"{path} is missing weights for {missing[:5]}{'...' if len(missing) > 5 else ''}")
+    return module.eval()
+
+
+def _build_empty(build):
+    """
+    Calls build(device) on the meta device so weights aren't initialized,
+    falling back to a normal build on the CPU.
+    """
+    try:
+        with torch.device("meta"):
+            return build("meta")
+    except Exception as e:
+        logger.debug(f"Meta-device build failed ({e}); initializing weights normally")
+        return build("cpu")
+
+
+def read_manifest(model_dir):
+    path = os.path.join(model_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(model_dir, manifest):
+    with open(os.path.join(model_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def clip_preprocess_config(model):
+    """The image preprocessing settings of a CLIP model as plain values, for the manifest or another process."""
+    image_size = model.visual.image_size
+    return {
+        "image_size": list(image_size) if isinstance(image_size, tuple) else image_size,
+        "mean": list(getattr(model.visual, "image_mean", None) or open_clip.OPENAI_DATASET_MEAN),
+        "std": list(getattr(model.visual, "image_std", None) or open_clip.OPENAI_DATASET_STD),
+    }
+
+
+def clip_transform(preprocess_config):
+    """Builds CLIP's evaluation image transform from clip_preprocess_config() values."""
+    image_size = preprocess_config["image_size"]
+    if isinstance(image_size, list):
+        image_size = tuple(image_size)
+    return open_clip.image_transform(image_size, is_train=False, mean=preprocess_config.get("mean"),
+                                     std=preprocess_config.get("std"))
+
+
+def load_clip(model_dir=None):
+    """
+    Returns (model, preprocess) for CLIP ViT-B-32, shared by the text and image processors.
+    Loads the prepared weights from model_dir when they exist, otherwise the standard checkpoint.
+    """
+    entry = read_manifest(model_dir).get("clip") if model_dir else None
+    if entry is None:
+        if model_dir:
+            logger.warning(f"No prepared CLIP weights in {model_dir}; loading the standard checkpoint")
+        model, _, preprocess = open_clip.create_model_and_transforms(CLIP_MODEL, pretrained=CLIP_PRETRAINED)
+        return model.eval(), preprocess
+    start = time.perf_counter()
+    # The openai checkpoints were trained with QuickGELU, which create_model only uses when asked;
+    # manifests written before quick_gelu was recorded are all openai ones
+    quick_gelu = entry.get("quick_gelu", entry.get("pretrained") == "openai")
+    # create_model moves the model to its device argument, so pass the build device through
+    model = _build_empty(lambda device: open_clip.create_model(
+        entry["model"], pretrained=None, device=device, force_quick_gelu=quick_gelu
+    ))
+    load_module_weights(model, os.path.join(model_dir, "clip", WEIGHTS_FILE))
+    logger.info(f"Loaded memory-mapped CLIP weights in {time.perf_counter() - start:.2f}s")
+    return model, clip_transform(entry)
+
+
+def compare_clip(model_dir):
+    """
+    Encodes a fixed text and image with the prepared CLIP weights in model_dir and with the
+    standard checkpoint. Returns the largest absolute difference between their embeddings.
+    """
+    from PIL import Image
+
+    if read_manifest(model_dir).get("clip") is None:
+        raise ValueError(f"No prepared CLIP weights in {model_dir}")
+    tokens = open_clip.get_tokenizer(CLIP_MODEL)(["a reaction gif of a happy dog"])
+    generator = torch.Generator().manual_seed(0)
+    image = Image.fromarray(torch.randint(0, 256, (120, 160, 3), generator=generator, dtype=torch.uint8).numpy())
+
+    def embed(clip):
+        model, preprocess = clip
+        with torch.no_grad():
+            return model.encode_text(tokens), model.encode_image(preprocess(image).unsqueeze(0))
+
+    prepared_text, prepared_image = embed(load_clip(model_dir))
+    reference_text, reference_image = embed(load_clip())
+    return max((prepared_text - reference_text).abs().max().item(),
+               (prepared_image - reference_image).abs().max().item())
+
+
+def load_classifier(model_name, key, model_dir=None):
+    """
+    Returns a text-classification pipeline (all label scores) for model_name.
+    Uses the prepared copy under model_dir/key when it exists, otherwise the Hugging Face Hub.
+    """
+    from transformers import pipeline
+
+    entry = read_manifest(model_dir).get(key) if model_dir else None
+    if entry is None:
+        if model_dir:
+            logger.warning(f"No prepared '{key}' model in {model_dir}; loading {model_name} from the Hub")
+        return pipeline("text-classification", model=model_name, return_all_scores=True)
+
+    from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+    start = time.perf_counter()
+    path = os.path.join(model_dir, key)
+    model_config = AutoConfig.from_pretrained(path)
+    model = _build_empty(lambda device: AutoModelForSequenceClassification.from_config(model_config))
+    load_module_weights(model, os.path.join(path, WEIGHTS_FILE))
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    logger.info(f"Loaded memory-mapped '{key}' model in {time.perf_counter() - start:.2f}s")
+    return pipeline("text-classification", model=model, tokenizer=tokenizer, return_all_scores=True)
+
+
+def prepare_models(model_dir):
+    """Downloads CLIP and both classifiers and writes them to model_dir in the memory-mappable format."""
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(model_dir, exist_ok=True)
+    manifest = {}
+
+    model, _, _ = open_clip.create_model_and_transforms(CLIP_MODEL, pretrained=CLIP_PRETRAINED)
+    save_module(model, os.path.join(model_dir, "clip", WEIGHTS_FILE))
+    # load_openai_model builds the openai checkpoints with QuickGELU; the state dict doesn't show it
+    manifest["clip"] = dict({"model": CLIP_MODEL, "pretrained": CLIP_PRETRAINED, "quick_gelu": True},
+                            **clip_preprocess_config(model))
+    print(f"Saved CLIP {CLIP_MODEL} ({CLIP_PRETRAINED})")
+
+    for key, model_name in (("emotion", EMOTION_MODEL), ("intent", INTENT_MODEL)):
+        path = os.path.join(model_dir, key)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.config.save_pretrained(path)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(path)
+        save_module(model, os.path.join(path, WEIGHTS_FILE))
+        manifest[key] = {"model": model_name}
+        print(f"Saved {key} model {model_name}")
+
+    manifest["torch"] = torch.__version__
+    _write_manifest(model_dir, manifest)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prepare = subparsers.add_parser("prepare", help="Download the models and save them for memory-mapped loading")
+    prepare.add_argument("--model-dir", required=True)
+    check = subparsers.add_parser("check", help="Time loading the prepared models and compare their CLIP embeddings")
+    check.add_argument("--model-dir", required=True)
+    for subparser in (prepare, check):
+        subparser.add_argument("--tolerance", type=float, default=1e-4,
+                               help="Largest allowed CLIP embedding difference from the standard checkpoint")
+    args = parser.parse_args(argv)
+
+    if args.command == "prepare":
+        prepare_models(args.model_dir)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        start = time.perf_counter()
+        load_clip(args.model_dir)
+        load_classifier(EMOTION_MODEL, "emotion", args.model_dir)
+        load_classifier(INTENT_MODEL, "intent", args.model_dir)
+        print(f"Loaded all models in {time.perf_counter() - start:.2f}s")
+
+    difference = compare_clip(args.model_dir)
+    print(f"CLIP embeddings differ from the standard checkpoint by at most {difference:.2e}")
+    if difference > args.tolerance:
+        print(f"Prepared CLIP weights in {args.model_dir} don't reproduce the standard embeddings")
+        return 1
+    if args.command == "prepare":
+        print(f"Prepared models in {args.model_dir}; start the app with MODEL_DIR={args.model_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
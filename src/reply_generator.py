@@ -1,35 +1,67 @@
-from transformers import pipeline
 import nltk
 from nltk.sentiment import SentimentIntensityAnalyzer
-from nltk.tokenize import word_tokenize, sent_tokenize
-from nltk.tag import pos_tag
 import torch
 from typing import Dict, List, Tuple
 import re
 
+from inference_worker import InferenceWorker
+from metrics import time_stage
+from model_store import EMOTION_MODEL, INTENT_MODEL, load_classifier
+from key_phrases import KeyPhraseExtractor
+
 class ReplyGenerator:
-    def __init__(self):
+    def __init__(self, worker_options=None, model_dir=None, reply_model=None,
+                 max_key_phrases=2, key_phrase_tokenizer="nltk"):
+        """
+        worker_options: when given, the emotion and intent pipelines run on
+        dedicated InferenceWorker threads created with these keyword options
+        (max_batch_size, max_wait_ms, max_queue_size, ...), so concurrent
+        messages are classified together in one batch.
+        model_dir: directory written by model_store.py prepare; the classifiers
+        are memory-mapped from it instead of loaded from the Hugging Face Hub.
+        reply_model: optional DialoGPTReplyGenerator used for generated reply text;
+        without it generate_reply returns an empty reply.
+        max_key_phrases: key phrases extracted per message (None for all);
+        get_gif_search_terms only uses the first two.
+        key_phrase_tokenizer: "nltk", or "hf" to split words with the emotion
+        model's fast tokenizer (see key_phrases.KeyPhraseExtractor).
+        """
+        self.reply_model = reply_model
         # Initialize sentiment analyzer
         self.sia = SentimentIntensityAnalyzer()
         
         # Initialize emotion classifier
-        self.emotion_classifier = pipeline(
-            "text-classification",
-            model="j-hartmann/emotion-english-distilroberta-base",
-            return_all_scores=True
-        )
+        self.emotion_classifier = load_classifier(EMOTION_MODEL, "emotion", model_dir)
         
         # Initialize intent classifier
-        self.intent_classifier = pipeline(
-            "text-classification",
-            model="facebook/bart-large-mnli",
-            return_all_scores=True
-        )
+        self.intent_classifier = load_classifier(INTENT_MODEL, "intent", model_dir)
+
+        self.emotion_worker = None
+        self.intent_worker = None
+        if worker_options is not None:
+            # Pipelines return one list of label scores per input message;
+            # batch_size makes them pad and run the whole list in one forward pass
+            self.emotion_worker = InferenceWorker(
+                "emotion",
+                lambda messages: self.emotion_classifier(messages, batch_size=len(messages)),
+                **worker_options
+            )
+            self.intent_worker = InferenceWorker(
+                "intent",
+                lambda messages: self.intent_classifier(messages, batch_size=len(messages)),
+                **worker_options
+            )
 
         # Download required NLTK data
         nltk.download('averaged_perceptron_tagger')
         nltk.download('maxent_ne_chunker')
         nltk.download('words')
+
+        # Key phrase extractor with a cached tagger; needs the tagger data downloaded above
+        hf_tokenizer = None
+        if key_phrase_tokenizer == "hf":
+            hf_tokenizer = getattr(self.emotion_classifier, "tokenizer", None)
+        self.key_phrase_extractor = KeyPhraseExtractor(max_phrases=max_key_phrases, hf_tokenizer=hf_tokenizer)
         
         # Message type patterns
         self.message_patterns = {
@@ -88,17 +120,29 @@ class ReplyGenerator:
             "opinion": ["considering opinion", "thinking about it", "processing reaction"]
         }
 
+    def _classify(self, classifier, worker, message: str) -> List[Dict]:
+        """Run a text-classification pipeline on one message, through its worker if one is set."""
+        if worker is not None:
+            return worker.run(message)
+        return classifier(message)[0]
+
     def analyze_message(self, message: str) -> Dict:
         """Analyze the message for sentiment, emotion, intent, and message type."""
+        with time_stage("analysis"):
+            return self._analyze_message(message)
+
+    def _analyze_message(self, message: str) -> Dict:
         # Get sentiment scores
         sentiment_scores = self.sia.polarity_scores(message)
         
         # Get emotion scores
-        emotion_scores = self.emotion_classifier(message)[0]
+        with time_stage("emotion_model"):
+            emotion_scores = self._classify(self.emotion_classifier, self.emotion_worker, message)
         emotion_scores.sort(key=lambda x: x["score"], reverse=True)
         
         # Get intent scores
-        intent_scores = self.intent_classifier(message)[0]
+        with time_stage("intent_model"):
+            intent_scores = self._classify(self.intent_classifier, self.intent_worker, message)
         intent_scores.sort(key=lambda x: x["score"], reverse=True)
         
         # Identify message types
@@ -107,24 +151,9 @@ class ReplyGenerator:
             if re.search(pattern, message.lower()):
                 message_types.append(msg_type)
         
-        # POS tagging for key phrases
-        tokens = word_tokenize(message)
-        pos_tags = pos_tag(tokens)
-        
-        # Extract key phrases (nouns, verbs, adjectives)
-        key_phrases = []
-        for i, (word, tag) in enumerate(pos_tags):
-            # Get nouns
-            if tag.startswith('NN'):
-                key_phrases.append(word)
-            # Get verbs
-            elif tag.startswith('VB'):
-                key_phrases.append(word)
-            # Get adjectives with their nouns
-            elif tag.startswith('JJ') and i + 1 < len(pos_tags):
-                next_word, next_tag = pos_tags[i + 1]
-                if next_tag.startswith('NN'):
-                    key_phrases.append(f"{word} {next_word}")
+        # Extract key phrases (nouns, verbs, adjectives with their nouns)
+        with time_stage("key_phrases"):
+            key_phrases = self.key_phrase_extractor.extract(message)
         
         return {
             "sentiment": sentiment_scores,
@@ -211,8 +240,19 @@ class ReplyGenerator:
         # Return top 5 most relevant terms
         return terms[:5]
 
-    def generate_reply(self, message: str, is_reply: bool = False) -> Tuple[str, Dict]:
-        """Generate a contextual reply based on detailed message analysis."""
+    def generate_reply_text(self, message: str, history: List[str] = None) -> str:
+        """Generates reply text with the reply model (history holds earlier turns, oldest first)."""
+        if self.reply_model is None:
+            return ""
+        return self.reply_model.generate(list(history or []) + [message])
+
+    def generate_reply(self, message: str, is_reply: bool = False, with_text: bool = False,
+                       history: List[str] = None) -> Tuple[str, Dict]:
+        """
+        Generate a contextual reply based on detailed message analysis.
+        The reply text is only generated when with_text is set, as it costs a generation pass;
+        history holds the earlier conversation turns, oldest first.
+        """
         # Analyze the message
         full_analysis = self.analyze_message(message)
         
@@ -231,5 +271,7 @@ class ReplyGenerator:
             "key_phrases": full_analysis["key_phrases"]
         }
         
+        reply = self.generate_reply_text(message, history) if with_text else ""
+
         # Return the analysis for GIF selection
-        return "", context 
\ No newline at end of file
+        return reply, context 
\ No newline at end of file
@@ -0,0 +1,197 @@
+# src/session_store.py
+import base64
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import numpy as np
+
+from sqlite_local import ThreadLocalConnection
+
+DEFAULT_CONVERSATION_ID = "default"
+
+
+def encode_embedding(embedding):
+    """Packs an embedding as base64 float16 so sessions stay small and JSON-serializable."""
+    return base64.b64encode(np.asarray(embedding, dtype=np.float16).tobytes()).decode("ascii")
+
+
+def decode_embedding(data, shape=(1, -1)):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float16).astype(np.float32).reshape(shape)
+
+
+def new_session():
+    return {"last_message_from_user2": "", "turns": [], "analyses": {}, "embeddings": {}}
+
+
+class SessionStore(ABC):
+    """
+    Per-conversation state keyed by conversation ID.
+
+    A session is a JSON-serializable dict holding the last message from user 2,
+    the conversation's last max_turns sent messages (the reply model's context),
+    plus small caches of recent message analyses and text embeddings, so the
+    typing -> send -> reply flow of one conversation doesn't analyse or encode
+    the same message twice. Backends only implement load/update.
+    """
+
+    def __init__(self, cache_size=8, max_turns=3):
+        self.cache_size = cache_size
+        self.max_turns = max_turns
+
+    @abstractmethod
+    def load(self, conversation_id):
+        """Returns the session dict for a conversation (a fresh one if unknown)."""
+
+    @abstractmethod
+    def update(self, conversation_id, mutate):
+        """Atomically applies mutate(session) to a conversation's session and stores it."""
+
+    def _remember(self, cache, key, value):
+        cache.pop(key, None)
+        cache[key] = value
+        # Dicts keep insertion order, so the first keys are the least recently stored
+        while len(cache) > self.cache_size:
+            del cache[next(iter(cache))]
+
+    def set_last_message(self, conversation_id, message):
+        def mutate(session):
+            session["last_message_from_user2"] = message
+            self._append_turn(session, message)
+        self.update(conversation_id, mutate)
+
+    def _append_turn(self, session, message):
+        # Sessions stored before turns were kept have no "turns" entry
+        turns = session.setdefault("turns", [])
+        # The same sent message reaches the store from several endpoints; keep it once
+        if not turns or turns[-1] != message:
+            turns.append(message)
+        del turns[:max(0, len(turns) - self.max_turns)]
+
+    def record_turn(self, conversation_id, message):
+        """
+        Adds a sent message to the conversation's recent turns.
+        Returns the turns before it, oldest first: the context for a reply to message.
+        """
+        earlier = []
+
+        def mutate(session):
+            self._append_turn(session, message)
+            earlier.extend(session["turns"][:-1])
+        self.update(conversation_id, mutate)
+        return earlier
+
+    def get_last_message(self, conversation_id):
+        return self.load(conversation_id)["last_message_from_user2"]
+
+    def cache_analysis(self, conversation_id, message, analysis):
+        self.update(conversation_id, lambda session: self._remember(session["analyses"], message, analysis))
+
+    def cached_analysis(self, conversation_id, message):
+        return self.load(conversation_id)["analyses"].get(message)
+
+    def cache_embedding(self, conversation_id, message, embedding):
+        encoded = encode_embedding(embedding)
+        self.update(conversation_id, lambda session: self._remember(session["embeddings"], message, encoded))
+
+    def cached_embedding(self, conversation_id, message):
+        encoded = self.load(conversation_id)["embeddings"].get(message)
+        return decode_embedding(encoded) if encoded is not None else None
+
+
+class InMemorySessionStore(SessionStore):
+    """Bounded LRU of sessions in this process. Fast, but not shared between workers."""
+
+    def __init__(self, max_sessions=10000, cache_size=8, max_turns=3):
+        super().__init__(cache_size, max_turns)
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, conversation_id):
+        with self._lock:
+            session = self._sessions.get(conversation_id)
+            if session is None:
+                return new_session()
+            self._sessions.move_to_end(conversation_id)
+            return json.loads(json.dumps(session))  # Callers get a copy, like the shared backends
+
+    def update(self, conversation_id, mutate):
+        with self._lock:
+            session = self._sessions.pop(conversation_id, None) or new_session()
+            mutate(session)
+            self._sessions[conversation_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a SQLite file, shared by every worker process on the host.
+    WAL mode lets readers proceed while one writer updates a session.
+    """
+
+    def __init__(self, path, max_sessions=100000, cache_size=8, max_turns=3, timeout=5.0):
+        super().__init__(cache_size, max_turns)
+        self.path = path
+        self.max_sessions = max_sessions
+        self.timeout = timeout
+        self._connection = ThreadLocalConnection(path, timeout).get
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def load(self, conversation_id):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else new_session()
+
+    def update(self, conversation_id, mutate):
+        conn = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front so concurrent read-modify-writes serialize
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM sessions WHERE id = ?", (conversation_id,)).fetchone()
+            session = json.loads(row[0]) if row else new_session()
+            mutate(session)
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+                (conversation_id, json.dumps(session), time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._evict()
+
+    def _evict(self):
+        """Drops the least recently updated sessions beyond max_sessions."""
+        self._connection().execute(
+            "DELETE FROM sessions WHERE id IN ("
+            " SELECT id FROM sessions ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+
+def create_session_store(backend="memory", path=None, max_sessions=10000, cache_size=8, max_turns=3):
+    """Builds the session store named by backend ("memory" or "sqlite")."""
+    if backend == "memory":
+        return InMemorySessionStore(max_sessions=max_sessions, cache_size=cache_size, max_turns=max_turns)
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("The sqlite session store needs a database path")
+        return SQLiteSessionStore(path, max_sessions=max_sessions, cache_size=cache_size, max_turns=max_turns)
+    raise ValueError(f"Unknown session store backend '{backend}', expected 'memory' or 'sqlite'")
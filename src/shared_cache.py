@@ -0,0 +1,209 @@
+# src/shared_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import record_cache_lookup
+from sqlite_local import ThreadLocalConnection
+
+
+class InProcessCacheBackend:
+    """
+    Dict-backed stand-in for a shared cache server. Shares nothing between
+    processes; used for single-worker setups and to exercise SharedCache without a server.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl if ttl else None, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCacheBackend:
+    """Cache in a local SQLite file, shared by all worker processes on one host."""
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._connection = ThreadLocalConnection(path, timeout).get
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return bytes(row[0])
+
+    def set(self, key, value, ttl=None):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(value), time.time() + ttl if ttl else None)
+        )
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+
+class RedisCacheBackend:
+    """Cache on a Redis-protocol server (Redis, Valkey, KeyDB, ...), shared across nodes."""
+
+    def __init__(self, url="redis://localhost:6379/0", timeout=0.5):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis shared cache backend needs the redis package: pip install redis")
+        # Short timeouts: a slow cache should never be slower than recomputing
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=int(ttl) if ttl else None)
+
+
+class NearCache:
+    """Small per-process LRU with a short TTL, kept in front of the shared backend for hot entries."""
+
+    def __init__(self, max_entries=2048, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        # Never keep a near copy longer than the shared entry lives
+        near_ttl = min(self.ttl, ttl) if ttl else self.ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + near_ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SharedCache:
+    """
+    Namespaced cache for Giphy responses, GIF embeddings and suggestion lists.
+
+    Values are looked up in the near cache first, then in the shared backend.
+    Backend errors are treated as misses so an unavailable cache server only
+    costs recomputation. Embeddings are stored as float16 blobs.
+    """
+
+    def __init__(self, backend, near_cache=None):
+        self.backend = backend
+        self.near = near_cache
+
+    @staticmethod
+    def _key(namespace, key):
+        # Hash keys so long messages and URLs map to short, fixed-size backend keys
+        return f"gif:{namespace}:{hashlib.sha1(key.encode()).hexdigest()}"
+
+    def get(self, namespace, key):
+        full_key = self._key(namespace, key)
+        if self.near is not None:
+            value = self.near.get(full_key)
+            if value is not None:
+                record_cache_lookup(f"{namespace}_near", True)
+                return value
+            record_cache_lookup(f"{namespace}_near", False)
+        try:
+            value = self.backend.get(full_key)
+        except Exception:
+            value = None
+        record_cache_lookup(namespace, value is not None)
+        if value is not None and self.near is not None:
+            self.near.set(full_key, value)
+        return value
+
+    def set(self, namespace, key, value, ttl=None):
+        full_key = self._key(namespace, key)
+        if self.near is not None:
+            self.near.set(full_key, value, ttl)
+        try:
+            self.backend.set(full_key, value, ttl)
+        except Exception:
+            pass
+
+    def get_json(self, namespace, key):
+        value = self.get(namespace, key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, namespace, key, data, ttl=None):
+        self.set(namespace, key, json.dumps(data).encode(), ttl)
+
+    def get_embedding(self, namespace, key):
+        """Returns a cached embedding as a float32 array of shape (1, embed_dim), or None."""
+        value = self.get(namespace, key)
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=np.float16).astype(np.float32).reshape(1, -1)
+
+    def set_embedding(self, namespace, key, embedding, ttl=None):
+        self.set(namespace, key, np.asarray(embedding, dtype=np.float16).tobytes(), ttl)
+
+
+def create_shared_cache(backend="memory", path=None, url=None, near_size=2048, near_ttl=60.0):
+    """
+    Builds a SharedCache for backend "memory", "sqlite" or "redis".
+    Returns None for "none", which disables the shared tier.
+    """
+    if backend == "none":
+        return None
+    if backend == "memory":
+        # Already in-process, so a near cache in front would only duplicate it
+        return SharedCache(InProcessCacheBackend())
+    near = NearCache(near_size, near_ttl) if near_size > 0 else None
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("The sqlite shared cache needs a database path")
+        return SharedCache(SQLiteCacheBackend(path), near)
+    if backend == "redis":
+        return SharedCache(RedisCacheBackend(url or "redis://localhost:6379/0"), near)
+    raise ValueError(f"Unknown shared cache backend '{backend}', expected none, memory, sqlite or redis")
@@ -0,0 +1,25 @@
+# src/sqlite_local.py
+import sqlite3
+import threading
+
+
+class ThreadLocalConnection:
+    """
+    Opens one sqlite3 connection per thread to a database file, on first use:
+    sqlite3 connections must not be shared between threads. Connections are in
+    autocommit mode, so callers issue BEGIN/COMMIT themselves, and use
+    synchronous=NORMAL, which is safe with WAL.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
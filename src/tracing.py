@@ -0,0 +1,250 @@
+# src/tracing.py
+"""
+Per-request tracing and sampled profiling.
+
+A trace is a tree of timed spans for one request. Pipeline stages timed
+with metrics.time_stage become spans automatically, and span() adds
+finer ones (one per Giphy term or GIF). The current span lives in a
+contextvar, so when no trace is active span() costs one lookup.
+
+RequestProfiler attaches cProfile, and optionally torch.profiler, to a
+request and dumps the result for offline flame-graph analysis:
+.prof files open in snakeviz or flameprof, and .json files are Chrome
+traces for chrome://tracing or Perfetto. Both profilers only see the
+thread they run on, so model inference, which runs on InferenceWorker
+threads, is profiled there by profile_batch() for every batch holding an
+item of a sampled request.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+# Only one torch.profiler session runs at a time; batches that can't get it are profiled with cProfile alone
+_torch_profile_lock = threading.Lock()
+
+
+class Span:
+    """One timed operation in a trace, with attributes and child spans."""
+
+    __slots__ = ("name", "attributes", "start", "end", "children")
+
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    def to_dict(self, origin=None):
+        """Nested dict with start offsets and durations in milliseconds, relative to the root span."""
+        origin = self.start if origin is None else origin
+        end = self.end if self.end is not None else time.perf_counter()
+        node = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+        }
+        if self.attributes:
+            node["attributes"] = self.attributes
+        if self.children:
+            node["children"] = [child.to_dict(origin) for child in self.children]
+        return node
+
+
+class span:
+    """
+    Context manager opening a child span of the current span.
+    Does nothing unless a trace is active in this context.
+    """
+
+    __slots__ = ("name", "attributes", "_span", "_token")
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._span = None
+        self._token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        self._span = Span(self.name, self.attributes)
+        parent.children.append(self._span)
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is None:
+            return False
+        self._span.finish()
+        if exc_type is not None:
+            self._span.attributes["error"] = exc_type.__name__
+        _current_span.reset(self._token)
+        return False
+
+
+def current_span():
+    """The innermost open span, or None when no trace is active."""
+    return _current_span.get()
+
+
+class Trace:
+    """The root span of one request's trace."""
+
+    def __init__(self, name, **attributes):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.root = Span(name, attributes)
+        self._token = _current_span.set(self.root)
+
+    def finish(self):
+        """Closes the root span and stops collecting spans in this context. Safe to call twice."""
+        self.root.finish()
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+
+    def to_dict(self):
+        return {"trace_id": self.trace_id, "root": self.root.to_dict()}
+
+
+class TraceWriter:
+    """Appends finished traces as JSON lines to a file shared by all request threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def write(self, trace):
+        line = json.dumps(trace.to_dict()) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+
+class ProfileHandle:
+    """A sampled request's profile, plus the profiles of the inference batches it took part in."""
+
+    def __init__(self, name, use_torch=False):
+        self.name = name
+        self.use_torch = use_torch
+        self.profile = cProfile.Profile()
+        self.batch_profiles = []
+        self.torch_profiles = []  # (worker name, torch profiler), one per batch
+        self.closed = False
+        self._token = None
+        self._lock = threading.Lock()
+
+    def add_batch(self, worker_name, profile, torch_profile=None):
+        with self._lock:
+            # A batch can finish after the request gave up waiting and was written out
+            if self.closed:
+                return
+            if profile is not None:
+                self.batch_profiles.append(profile)
+            if torch_profile is not None and self.use_torch:
+                self.torch_profiles.append((worker_name, torch_profile))
+
+
+def current_profile():
+    """The ProfileHandle of the request being profiled in this context, or None."""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_batch(worker_name, handles):
+    """
+    Profiles one inference batch on the calling worker thread and adds the
+    result to every handle in handles (the sampled requests in the batch).
+    The batch's profile covers all of its items, sampled or not.
+    """
+    if not handles:
+        yield
+        return
+    torch_profile = None
+    if any(handle.use_torch for handle in handles) and _torch_profile_lock.acquire(blocking=False):
+        try:
+            import torch
+            torch_profile = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True, with_stack=True
+            )
+            torch_profile.__enter__()
+        except Exception:
+            torch_profile = None
+            _torch_profile_lock.release()
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Python 3.12+ allows one cProfile per interpreter; the request thread's holds it
+        profile = None
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+        if torch_profile is not None:
+            try:
+                torch_profile.__exit__(None, None, None)
+            finally:
+                _torch_profile_lock.release()
+        for handle in handles:
+            handle.add_batch(worker_name, profile, torch_profile)
+
+
+class RequestProfiler:
+    """
+    Profiles single requests with cProfile and, with use_torch, torch.profiler,
+    writing the files for each request to directory.
+
+    cProfile covers the request thread and every inference batch the request
+    took part in, merged into one .prof file. torch.profiler only runs inside
+    those batches, where the model time is; each batch gets its own Chrome trace.
+    """
+
+    def __init__(self, directory, use_torch=False):
+        self.directory = directory
+        self.use_torch = use_torch
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, name):
+        """Starts profiling the calling thread, and the inference batches it submits work to."""
+        handle = ProfileHandle(name, self.use_torch)
+        handle._token = _current_profile.set(handle)
+        handle.profile.enable()
+        return handle
+
+    def stop(self, handle):
+        """Stops profiling and writes the dumps; returns the paths written."""
+        handle.profile.disable()
+        if handle._token is not None:
+            _current_profile.reset(handle._token)
+            handle._token = None
+        with handle._lock:
+            handle.closed = True
+        base = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{handle.name}-{uuid.uuid4().hex[:8]}")
+        paths = [f"{base}.prof"]
+        stats = pstats.Stats(handle.profile)
+        for profile in handle.batch_profiles:
+            stats.add(profile)
+        stats.dump_stats(paths[0])
+        for index, (worker_name, torch_profile) in enumerate(handle.torch_profiles):
+            paths.append(f"{base}.{worker_name}-{index}.torch.json")
+            torch_profile.export_chrome_trace(paths[-1])
+        return paths
@@ -0,0 +1,132 @@
+# src/validate_clip_backend.py
+"""
+Checks an optimized CLIP backend against the fp32 eager model before enabling it.
+
+For a fixture set of texts and GIFs it reports the cosine error of every
+embedding and, for each text, how many of the fp32 top-k GIFs the optimized
+backend also ranks in its top-k. Exits non-zero if the thresholds are missed.
+
+    python src/validate_clip_backend.py --backend int8 --gifs path/to/gif_dir
+"""
+import argparse
+import json
+import os
+import sys
+
+import torch
+
+from clip_module import TextProcessor
+from clip_optimize import BACKENDS
+from gif_processor import GifProcessor
+from model_store import load_clip
+
+# Representative chat messages used when no --texts file is given
+DEFAULT_TEXTS = [
+    "I'm feeling excited and joyful today!",
+    "I feel so miserable.",
+    "omg that's hilarious",
+    "thank you so much!",
+    "ugh, mondays",
+    "congrats on the new job!",
+    "I'm so angry right now",
+    "wait, what just happened?",
+    "good night, see you tomorrow",
+    "that's disgusting",
+    "I'm scared of the exam",
+    "let's dance",
+]
+
+
+def load_lines(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_gif_paths(source):
+    """A directory of .gif files, or a text file with one path/URL per line."""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name) for name in os.listdir(source) if name.lower().endswith(".gif")
+        )
+    return load_lines(source)
+
+
+def embed_gifs(processor, gif_paths):
+    return torch.cat([processor.get_gif_embedding(path) for path in gif_paths], dim=0)
+
+
+def cosine_errors(reference, candidate):
+    """1 - cosine similarity between matching rows of two normalized embedding matrices."""
+    return 1.0 - (reference * candidate).sum(dim=-1)
+
+
+def top_k_overlap(reference_scores, candidate_scores, k):
+    """Fraction of the reference top-k found in the candidate top-k, per query row."""
+    k = min(k, reference_scores.shape[1])
+    ref_top = reference_scores.topk(k, dim=-1).indices.tolist()
+    cand_top = candidate_scores.topk(k, dim=-1).indices.tolist()
+    return [len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)]
+
+
+def validate(backend, texts, gif_paths, top_k=6, artifact_dir=None, model_dir=None):
+    """Returns a report dict comparing `backend` to the fp32 eager encoders."""
+    # One CLIP model serves both the reference and the candidate processors
+    clip = load_clip(model_dir)
+    reference_text = TextProcessor(backend="eager", clip=clip)
+    reference_gif = GifProcessor(backend="eager", clip=clip)
+    ref_text_emb = reference_text.get_text_embeddings(texts).cpu().float()
+    ref_gif_emb = embed_gifs(reference_gif, gif_paths).cpu().float()
+
+    # Built only after the reference embeddings exist: the int8 backends quantize the shared model in place
+    candidate_text = TextProcessor(backend=backend, artifact_dir=artifact_dir, clip=clip)
+    candidate_gif = GifProcessor(backend=backend, artifact_dir=artifact_dir, clip=clip)
+    cand_text_emb = candidate_text.get_text_embeddings(texts).cpu().float()
+    cand_gif_emb = embed_gifs(candidate_gif, gif_paths).cpu().float()
+
+    text_errors = cosine_errors(ref_text_emb, cand_text_emb)
+    gif_errors = cosine_errors(ref_gif_emb, cand_gif_emb)
+    overlaps = top_k_overlap(ref_text_emb @ ref_gif_emb.T, cand_text_emb @ cand_gif_emb.T, top_k)
+
+    return {
+        "backend": backend,
+        "texts": len(texts),
+        "gifs": len(gif_paths),
+        "top_k": top_k,
+        "text_cosine_error": {"mean": text_errors.mean().item(), "max": text_errors.max().item()},
+        "gif_cosine_error": {"mean": gif_errors.mean().item(), "max": gif_errors.max().item()},
+        "top_k_overlap": {"mean": sum(overlaps) / len(overlaps), "min": min(overlaps)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", required=True, choices=[b for b in BACKENDS if b != "eager"])
+    parser.add_argument("--gifs", required=True, help="Directory of GIFs or file listing GIF paths/URLs")
+    parser.add_argument("--texts", help="File with one query text per line (default: built-in chat messages)")
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--artifact-dir", help="Where compiled artifacts are cached")
+    parser.add_argument("--model-dir", help="Prepared model directory (see model_store.py)")
+    parser.add_argument("--min-overlap", type=float, default=0.8, help="Minimum mean top-k overlap")
+    parser.add_argument("--max-cosine-error", type=float, default=0.01, help="Maximum per-embedding cosine error")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    texts = load_lines(args.texts) if args.texts else DEFAULT_TEXTS
+    gif_paths = load_gif_paths(args.gifs)
+    if not gif_paths:
+        parser.error(f"No GIFs found in {args.gifs}")
+
+    report = validate(args.backend, texts, gif_paths, args.top_k, args.artifact_dir, args.model_dir)
+    worst_error = max(report["text_cosine_error"]["max"], report["gif_cosine_error"]["max"])
+    report["passed"] = (report["top_k_overlap"]["mean"] >= args.min_overlap
+                        and worst_error <= args.max_cosine_error)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
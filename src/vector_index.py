@@ -18,6 +18,42 @@ class VectorIndex:
         self.index.add(embedding)
         self.metadata.append(meta)
 
+    def add_embeddings(self, embeddings: np.ndarray, metas: list):
+        """
+        Add many normalized embeddings in one call.
+        embeddings: numpy array of shape (n, embed_dim)
+        metas: list of n metadata entries
+        """
+        self.index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+        self.metadata.extend(metas)
+
+    @classmethod
+    def from_corpus(cls, directory):
+        """
+        Builds an index from a corpus written by ingest_gifs.py.
+        Metadata entries are the corpus records (dicts with id, url, title, tags).
+        """
+        from gif_corpus import iter_shards, read_manifest
+        embed_dim = read_manifest(directory)["embed_dim"]
+        if embed_dim is None:
+            raise ValueError(f"No GIF corpus found in {directory}")
+        index = cls(embed_dim)
+        for embeddings, metadata in iter_shards(directory):
+            index.add_embeddings(embeddings, metadata)
+        return index
+
+    def reconstruct(self, ids) -> np.ndarray:
+        """
+        Returns the stored embeddings for the given row ids, shape (len(ids), embed_dim),
+        so candidates found elsewhere can be scored without re-encoding them.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.size == 0:
+            return np.zeros((0, self.embed_dim), dtype=np.float32)
+        if hasattr(self.index, "reconstruct_batch"):
+            return self.index.reconstruct_batch(ids)
+        return np.vstack([self.index.reconstruct(int(i)) for i in ids])
+
     def search(self, query_embedding: np.ndarray, top_k=5):
         """
         Search for the top_k similar embeddings.
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# The app imports its modules flat from src/, as when run with "python src/main.py"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,219 @@
+# tests/test_shared_cache.py
+import sys
+import types
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import shared_cache
+from shared_cache import (
+    InProcessCacheBackend,
+    NearCache,
+    RedisCacheBackend,
+    SharedCache,
+    SQLiteCacheBackend,
+    create_shared_cache,
+)
+
+
+class FakeClock:
+    """Stands in for the time module in shared_cache so TTLs can expire without sleeping."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class StubRedisClient:
+    """The subset of redis.Redis the backend uses, keeping values in a dict and expiring them on the FakeClock."""
+
+    def __init__(self, url, clock, **kwargs):
+        self.url = url
+        self.kwargs = kwargs
+        self.clock = clock
+        self.values = {}  # key -> (value, expires_at)
+
+    def get(self, key):
+        value, expires_at = self.values.get(key, (None, None))
+        if expires_at is not None and expires_at <= self.clock.now:
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        assert isinstance(value, bytes)
+        assert ex is None or (isinstance(ex, int) and ex > 0)
+        self.values[key] = (value, self.clock.now + ex if ex else None)
+        return True
+
+
+class FailingBackend:
+    def get(self, key):
+        raise ConnectionError("cache server down")
+
+    def set(self, key, value, ttl=None):
+        raise ConnectionError("cache server down")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(shared_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def stub_redis(monkeypatch, clock):
+    """Installs a stand-in redis module, so RedisCacheBackend runs without a server or the redis package."""
+    module = types.ModuleType("redis")
+    module.Redis = types.SimpleNamespace(from_url=lambda url, **kwargs: StubRedisClient(url, clock, **kwargs))
+    monkeypatch.setitem(sys.modules, "redis", module)
+    return module
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InProcessCacheBackend()
+    if request.param == "redis":
+        request.getfixturevalue("stub_redis")
+        return RedisCacheBackend("redis://cache:6379/0")
+    return SQLiteCacheBackend(str(tmp_path / "cache.db"))
+
+
+def test_backend_entries_expire_after_ttl(backend, clock):
+    backend.set("short", b"1", ttl=10)
+    backend.set("forever", b"2")
+    clock.advance(9)
+    assert backend.get("short") == b"1"
+    clock.advance(2)
+    assert backend.get("short") is None
+    assert backend.get("forever") == b"2"
+
+
+def test_redis_backend_passes_whole_second_ttls_and_short_timeouts(stub_redis):
+    backend = RedisCacheBackend("redis://cache:6379/0", timeout=0.25)
+    assert backend.client.url == "redis://cache:6379/0"
+    assert backend.client.kwargs == {"socket_timeout": 0.25, "socket_connect_timeout": 0.25}
+    backend.set("fractional", b"1", ttl=30.7)
+    backend.set("forever", b"2")
+    assert backend.client.values["fractional"] == (b"1", 1030.0)
+    assert backend.client.values["forever"] == (b"2", None)
+
+
+def test_redis_backend_needs_the_redis_package(monkeypatch):
+    monkeypatch.setitem(sys.modules, "redis", None)
+    with pytest.raises(ImportError, match="pip install redis"):
+        RedisCacheBackend()
+
+
+def test_in_process_backend_evicts_least_recently_used():
+    backend = InProcessCacheBackend(max_entries=2)
+    backend.set("a", b"1")
+    backend.set("b", b"2")
+    backend.get("a")
+    backend.set("c", b"3")
+    assert backend.get("a") == b"1"
+    assert backend.get("b") is None
+    assert backend.get("c") == b"3"
+
+
+def test_namespaces_are_isolated(backend):
+    cache = SharedCache(backend)
+    cache.set("giphy", "happy", b"giphy response")
+    cache.set("search", "happy", b"search response")
+    assert cache.get("giphy", "happy") == b"giphy response"
+    assert cache.get("search", "happy") == b"search response"
+    assert cache.get("suggestions", "happy") is None
+
+
+def test_json_round_trip(backend):
+    cache = SharedCache(backend)
+    cache.set_json("giphy", "happy", {"gifs": [{"id": "1", "url": "a.gif"}]})
+    assert cache.get_json("giphy", "happy") == {"gifs": [{"id": "1", "url": "a.gif"}]}
+    assert cache.get_json("giphy", "sad") is None
+
+
+def test_embedding_round_trip_through_float16(backend):
+    cache = SharedCache(backend)
+    rng = np.random.default_rng(0)
+    embedding = rng.standard_normal((1, 512)).astype(np.float32)
+    embedding /= np.linalg.norm(embedding)
+    cache.set_embedding("gif_embedding_eager", "https://example.com/a.gif", embedding)
+
+    stored = backend.get(SharedCache._key("gif_embedding_eager", "https://example.com/a.gif"))
+    assert len(stored) == 512 * 2
+    restored = cache.get_embedding("gif_embedding_eager", "https://example.com/a.gif")
+    assert restored.dtype == np.float32
+    assert restored.shape == (1, 512)
+    np.testing.assert_allclose(restored, embedding, atol=1e-3)
+    assert float(restored[0] @ embedding[0]) > 0.9999
+
+
+def test_near_cache_serves_hot_entries_without_the_backend(clock):
+    backend = InProcessCacheBackend()
+    cache = SharedCache(backend, NearCache(ttl=60))
+    cache.set("giphy", "happy", b"v1")
+    # Another worker updates the shared entry; this process keeps its near copy until it expires
+    backend.set(SharedCache._key("giphy", "happy"), b"v2")
+    assert cache.get("giphy", "happy") == b"v1"
+    clock.advance(61)
+    assert cache.get("giphy", "happy") == b"v2"
+
+
+def test_near_cache_is_updated_on_write(clock):
+    cache = SharedCache(InProcessCacheBackend(), NearCache(ttl=60))
+    cache.set("giphy", "happy", b"v1")
+    assert cache.get("giphy", "happy") == b"v1"
+    cache.set("giphy", "happy", b"v2")
+    assert cache.get("giphy", "happy") == b"v2"
+
+
+def test_near_copy_never_outlives_the_shared_entry(clock):
+    cache = SharedCache(InProcessCacheBackend(), NearCache(ttl=60))
+    cache.set("suggestions", "hi", b"v1", ttl=5)
+    clock.advance(6)
+    assert cache.get("suggestions", "hi") is None
+
+
+def test_near_cache_evicts_least_recently_used(clock):
+    near = NearCache(max_entries=2, ttl=60)
+    near.set("a", b"1")
+    near.set("b", b"2")
+    near.get("a")
+    near.set("c", b"3")
+    assert near.get("a") == b"1"
+    assert near.get("b") is None
+
+
+def test_backend_errors_are_misses():
+    cache = SharedCache(FailingBackend())
+    cache.set("giphy", "happy", b"v1")
+    assert cache.get("giphy", "happy") is None
+
+
+def test_create_shared_cache(tmp_path):
+    assert create_shared_cache("none") is None
+    memory = create_shared_cache("memory")
+    assert isinstance(memory.backend, InProcessCacheBackend)
+    assert memory.near is None
+    sqlite = create_shared_cache("sqlite", path=str(tmp_path / "cache.db"), near_size=16)
+    assert isinstance(sqlite.backend, SQLiteCacheBackend)
+    assert isinstance(sqlite.near, NearCache)
+    with pytest.raises(ValueError):
+        create_shared_cache("memcached")
+
+
+def test_create_redis_shared_cache(stub_redis):
+    redis_cache = create_shared_cache("redis", url="redis://cache:6379/0", near_size=16)
+    assert isinstance(redis_cache.backend, RedisCacheBackend)
+    assert redis_cache.backend.client.url == "redis://cache:6379/0"
+    assert isinstance(redis_cache.near, NearCache)